@@ -0,0 +1,318 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+
+# Airport search shared by the airports/find_airports handlers. The dataset is parsed
+# once per process and kept as __slots__ records plus a few lookup structures:
+#   - IATA codes (already sorted in the file) for exact and prefix matches
+#   - a sorted word list for "word starts with" matches on name/city
+#   - 2- and 3-gram postings for plain substring matches
+# Results are ranked in that order, then by position in the file.
+#
+# scripts/download_airports.py also writes airports.bin, the same index laid out
+# flat so it can be mmapped instead of parsed (see write_binary_index).
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'airports.json')
+BIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'airports.bin')
+DEFAULT_LIMIT = 10
+
+
+class Airport:
+    __slots__ = ("iata", "name", "city", "country", "lat", "lon")
+
+    def __init__(self, iata, name, city, country, lat, lon):
+        self.iata = iata
+        self.name = name
+        self.city = city
+        self.country = country
+        self.lat = lat
+        self.lon = lon
+
+    def to_dict(self):
+        return {
+            "iata": self.iata,
+            "name": self.name,
+            "city": self.city,
+            "country": self.country,
+            "lat": self.lat,
+            "lon": self.lon
+        }
+
+
+def _words(text):
+    return [w for w in text.replace("-", " ").replace("/", " ").split() if w]
+
+
+class AirportIndex:
+    __slots__ = ("airports", "iatas", "haystacks", "words", "word_ids", "grams")
+
+    def __init__(self, airports):
+        self.airports = airports
+        self.iatas = [a.iata.lower() for a in airports]
+        self.haystacks = [f"{a.iata}\n{a.name}\n{a.city}".lower() for a in airports]
+
+        pairs = set()
+        grams = {}
+        for i, airport in enumerate(airports):
+            for word in _words(f"{airport.name} {airport.city}".lower()):
+                pairs.add((word, i))
+
+            hay = self.haystacks[i]
+            seen = set()
+            for size in (2, 3):
+                for start in range(len(hay) - size + 1):
+                    gram = hay[start:start + size]
+                    if "\n" not in gram and gram not in seen:
+                        seen.add(gram)
+                        grams.setdefault(gram, array('I')).append(i)
+
+        pairs = sorted(pairs)
+        self.words = [w for w, _ in pairs]
+        self.word_ids = array('I', [i for _, i in pairs])
+        self.grams = grams
+
+    def _iata_prefix(self, q):
+        start = bisect.bisect_left(self.iatas, q)
+        end = bisect.bisect_left(self.iatas, q + "\uffff", start)
+        return range(start, end)
+
+    def _word_prefix(self, q):
+        start = bisect.bisect_left(self.words, q)
+        end = bisect.bisect_left(self.words, q + "\uffff", start)
+        return sorted(set(self.word_ids[start:end]))
+
+    def _substring(self, q):
+        if len(q) < 2:
+            return []
+        size = 3 if len(q) >= 3 else 2
+        postings = []
+        for start in range(len(q) - size + 1):
+            ids = self.grams.get(q[start:start + size])
+            if ids is None:
+                return []
+            postings.append(ids)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+        return sorted(i for i in candidates if q in self.haystacks[i])
+
+    def search(self, q, limit=DEFAULT_LIMIT):
+        q = q.strip().lower()
+        if not q:
+            return []
+
+        picked = []
+        seen = set()
+        for tier in (self._iata_prefix, self._word_prefix, self._substring):
+            for i in tier(q):
+                if i not in seen:
+                    seen.add(i)
+                    picked.append(i)
+                    if len(picked) >= limit:
+                        return [self.airports[i] for i in picked]
+        return [self.airports[i] for i in picked]
+
+
+# airports.bin, little-endian:
+#   header   magic, record/word/gram counts, section offsets
+#   records  fixed width, in IATA order: iata, country, lat, lon and (offset, length)
+#            pairs into the string pool for name, city and the lowercased haystack
+#   words    (pool offset, length, airport id), sorted by UTF-8 bytes
+#   grams    (pool offset, length, postings offset, postings count), sorted by bytes
+#   postings u32 airport ids
+#   pool     UTF-8 strings
+BIN_MAGIC = b"PAX1"
+BIN_HEADER = struct.Struct("<4s8I")
+BIN_RECORD = struct.Struct("<3s2sddIHIHIH")
+BIN_WORD = struct.Struct("<IHI")
+BIN_GRAM = struct.Struct("<IBII")
+
+
+def write_binary_index(airports, path=BIN_PATH):
+    index = AirportIndex(airports)
+    pool = bytearray()
+    pooled = {}
+
+    def put(text):
+        raw = text.encode('utf-8')
+        offset = pooled.get(raw)
+        if offset is None:
+            offset = pooled[raw] = len(pool)
+            pool.extend(raw)
+        return offset, len(raw)
+
+    records = bytearray()
+    for airport, hay in zip(airports, index.haystacks):
+        records += BIN_RECORD.pack(
+            airport.iata.encode('ascii', 'replace')[:3],
+            (airport.country or "").encode('ascii', 'replace')[:2],
+            airport.lat, airport.lon,
+            *put(airport.name), *put(airport.city), *put(hay))
+
+    words = bytearray()
+    word_pairs = sorted(zip(index.words, index.word_ids), key=lambda p: (p[0].encode('utf-8'), p[1]))
+    for word, airport_id in word_pairs:
+        words += BIN_WORD.pack(*put(word), airport_id)
+
+    grams = bytearray()
+    postings = array('I')
+    for gram in sorted(index.grams, key=lambda g: g.encode('utf-8')):
+        ids = index.grams[gram]
+        offset, length = put(gram)
+        grams += BIN_GRAM.pack(offset, length, len(postings), len(ids))
+        postings.extend(ids)
+
+    off_records = BIN_HEADER.size
+    off_words = off_records + len(records)
+    off_grams = off_words + len(words)
+    off_postings = off_grams + len(grams)
+    off_pool = off_postings + len(postings) * postings.itemsize
+    header = BIN_HEADER.pack(BIN_MAGIC, len(airports), len(word_pairs), len(index.grams),
+                             off_records, off_words, off_grams, off_postings, off_pool)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(records)
+        f.write(words)
+        f.write(grams)
+        f.write(postings.tobytes())
+        f.write(pool)
+    os.replace(tmp_path, path)
+
+
+class _Column:
+    # Sequence view over one key of a fixed-width table, so bisect can search the mmap directly.
+    __slots__ = ("get", "count")
+
+    def __init__(self, get, count):
+        self.get = get
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.get(i)
+
+
+class MappedAirportIndex:
+    __slots__ = ("buf", "count", "n_words", "n_grams", "off_records", "off_words", "off_grams",
+                 "off_postings", "off_pool", "iatas", "word_keys", "gram_keys")
+
+    def __init__(self, path=BIN_PATH):
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.count, self.n_words, self.n_grams, self.off_records, self.off_words,
+         self.off_grams, self.off_postings, self.off_pool) = BIN_HEADER.unpack_from(self.buf, 0)
+        if magic != BIN_MAGIC:
+            raise ValueError("Unsupported airports.bin format")
+
+        self.iatas = _Column(lambda i: self._record(i)[0].lower(), self.count)
+        self.word_keys = _Column(lambda i: self._pooled(*BIN_WORD.unpack_from(
+            self.buf, self.off_words + i * BIN_WORD.size)[:2]), self.n_words)
+        self.gram_keys = _Column(lambda i: self._pooled(*BIN_GRAM.unpack_from(
+            self.buf, self.off_grams + i * BIN_GRAM.size)[:2]), self.n_grams)
+
+    def _record(self, i):
+        return BIN_RECORD.unpack_from(self.buf, self.off_records + i * BIN_RECORD.size)
+
+    def _pooled(self, offset, length):
+        start = self.off_pool + offset
+        return self.buf[start:start + length]
+
+    def _airport(self, i):
+        iata, country, lat, lon, name_off, name_len, city_off, city_len, _, _ = self._record(i)
+        return Airport(iata.decode('ascii'), self._pooled(name_off, name_len).decode('utf-8'),
+                       self._pooled(city_off, city_len).decode('utf-8'), country.decode('ascii'), lat, lon)
+
+    def _postings(self, i):
+        _, _, offset, count = BIN_GRAM.unpack_from(self.buf, self.off_grams + i * BIN_GRAM.size)
+        start = self.off_postings + offset * 4
+        return array('I', self.buf[start:start + count * 4])
+
+    def _iata_prefix(self, q):
+        start = bisect.bisect_left(self.iatas, q)
+        end = bisect.bisect_left(self.iatas, q + b"\xff", start)
+        return range(start, end)
+
+    def _word_prefix(self, q):
+        start = bisect.bisect_left(self.word_keys, q)
+        end = bisect.bisect_left(self.word_keys, q + b"\xff", start)
+        return sorted({BIN_WORD.unpack_from(self.buf, self.off_words + i * BIN_WORD.size)[2]
+                       for i in range(start, end)})
+
+    def _substring(self, q):
+        text = q.decode('utf-8')
+        if len(text) < 2:
+            return []
+        size = 3 if len(text) >= 3 else 2
+        postings = []
+        for start in range(len(text) - size + 1):
+            gram = text[start:start + size].encode('utf-8')
+            i = bisect.bisect_left(self.gram_keys, gram)
+            if i >= self.n_grams or self.gram_keys[i] != gram:
+                return []
+            postings.append(self._postings(i))
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+
+        matches = []
+        for i in sorted(candidates):
+            hay_off, hay_len = self._record(i)[8:]
+            if q in self._pooled(hay_off, hay_len):
+                matches.append(i)
+        return matches
+
+    def search(self, q, limit=DEFAULT_LIMIT):
+        q = q.strip().lower().encode('utf-8')
+        if not q:
+            return []
+
+        picked = []
+        seen = set()
+        for tier in (self._iata_prefix, self._word_prefix, self._substring):
+            for i in tier(q):
+                if i not in seen:
+                    seen.add(i)
+                    picked.append(i)
+                    if len(picked) >= limit:
+                        return [self._airport(i) for i in picked]
+        return [self._airport(i) for i in picked]
+
+
+_index = None
+
+
+def load_airports(path=DATA_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return [Airport(a['iata'], a['name'], a['city'], a['country'], a['lat'], a['lon']) for a in raw]
+
+
+def get_index():
+    global _index
+    if _index is None:
+        try:
+            _index = MappedAirportIndex()
+        except (OSError, ValueError):
+            # No prebuilt artifact (or an old format): build the index from the JSON.
+            _index = AirportIndex(load_airports())
+    return _index
+
+
+def search_airports(q, limit=DEFAULT_LIMIT):
+    return [a.to_dict() for a in get_index().search(q, limit)]
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import _metrics
+
+# Directory for caches shared between processes (flight snapshots, learned images).
+CACHE_DIR = os.environ.get("PASSAIR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "passair")
+
+# In-process TTL + LRU cache whose loads are coalesced: concurrent misses on the
+# same key wait for one in-flight loader instead of each calling upstream.
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    # With a name, lookups are counted as hits and misses in the metrics.
+    def __init__(self, ttl, max_entries=256, name=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                entry = None
+            else:
+                self._entries.move_to_end(key)
+        if self.name:
+            _metrics.cache_result(self.name, "miss" if entry is None else "hit")
+        return None if entry is None else entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_entry(self, key):
+        # (stored_at, value) while the entry is within ttl, else None.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is not None:
+            return value
+        return self.load(key, loader)
+
+    def load(self, key, loader):
+        # Always calls loader, but concurrent loads of one key share a single call.
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            if flight.value is not None:
+                self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SWRCache:
+    # Stale-while-revalidate: entries younger than ttl are served as is; older ones, however
+    # old, are still served immediately while one background refresh runs, so a slow or
+    # failing upstream never holds up a request that has something to show. Only a key
+    # with nothing cached waits for its load, and a failed load never replaces a good value.
+
+    def __init__(self, ttl, max_entries=256, name=None):
+        self.ttl = ttl
+        self.name = name
+        self._entries = TTLCache(float("inf"), max_entries)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        entry = self._entries.get_entry(key)
+        if entry is None:
+            result = "miss"
+            self._entries.load(key, loader)
+            entry = self._entries.get_entry(key)
+        elif time.time() - entry[0] >= self.ttl:
+            result = "stale"
+            self.refresh(key, loader)
+        else:
+            result = "hit"
+
+        if self.name:
+            _metrics.cache_result(self.name, result)
+        if entry is None:
+            return None, None
+
+        stored_at, value = entry
+        return value, stored_at
+
+    def refresh(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._entries.load(key, loader)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def load(self, key, loader):
+        return self._entries.load(key, loader)
+
+    def peek(self, key):
+        return self._entries.get_entry(key)
@@ -0,0 +1,142 @@
+import importlib
+import os
+import threading
+
+# One FlightRadar24API per process, with its HTTP traffic sent through a shared,
+# connection-pooled requests.Session so calls reuse TCP/TLS connections instead of
+# opening new ones every time.
+
+flight_api_error = None
+try:
+    from FlightRadar24 import FlightRadar24API
+except ImportError as e1:
+    try:
+        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
+    except ImportError as e2:
+        FlightRadar24API = None
+        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
+
+try:
+    import requests
+    from requests.adapters import BaseAdapter, HTTPAdapter
+except ImportError:
+    requests = None
+    BaseAdapter = object
+
+POOL_HOSTS = int(os.environ.get("PASSAIR_UPSTREAM_HOSTS", "4"))
+POOL_PER_HOST = int(os.environ.get("PASSAIR_UPSTREAM_CONNECTIONS", "10"))
+
+# Modules of the FlightRadar24 packages that call requests.get/post directly.
+_REQUEST_MODULES = ("FlightRadar24.request", "FlightRadarAPI.request")
+
+_lock = threading.Lock()
+_state = {"api": None, "session": None}
+
+
+def _new_session():
+    session = requests.Session()
+    # pool_block keeps each upstream host at POOL_PER_HOST connections, however many threads ask.
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _PooledRequests:
+    # Drop-in for the `requests` module inside the FlightRadar24 package: the verbs go
+    # through the pooled session, anything else (exceptions, etc.) to requests itself.
+
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, *args, **kwargs):
+        return self.session.get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return self.session.post(*args, **kwargs)
+
+    def request(self, *args, **kwargs):
+        return self.session.request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def _install_session(session):
+    for name in _REQUEST_MODULES:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        if hasattr(module, "requests"):
+            module.requests = _PooledRequests(session)
+
+
+def get_session():
+    if requests is None:
+        return None
+    with _lock:
+        if _state["session"] is None:
+            _state["session"] = _new_session()
+            _install_session(_state["session"])
+        return _state["session"]
+
+
+def get_api():
+    if flight_api_error:
+        raise ImportError(flight_api_error)
+
+    get_session()
+    with _lock:
+        if _state["api"] is None:
+            _state["api"] = FlightRadar24API()
+        return _state["api"]
+
+
+class LocalTransport(BaseAdapter):
+    # Stand-in for the network: answers requests from a table of URL prefix -> handler,
+    # where a handler takes the PreparedRequest and returns (status, body[, headers]).
+
+    def __init__(self, routes=None):
+        super().__init__()
+        self.routes = dict(routes or {})
+        self.calls = []
+
+    def send(self, request, **kwargs):
+        self.calls.append(request.url)
+        for prefix, respond in self.routes.items():
+            if request.url.startswith(prefix):
+                result = respond(request)
+                break
+        else:
+            result = (404, b"")
+
+        status, body = result[0], result[1]
+        headers = result[2] if len(result) > 2 else {}
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = body if isinstance(body, bytes) else str(body).encode('utf-8')
+        response.headers.update(headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def use_transport(adapter):
+    # Route every upstream call through `adapter` (e.g. a LocalTransport) instead of the network.
+    session = get_session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def reset():
+    with _lock:
+        if _state["session"] is not None:
+            _state["session"].close()
+        _state["api"] = None
+        _state["session"] = None
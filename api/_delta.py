@@ -0,0 +1,37 @@
+# Diffs two views of the same viewport. Positions are rounded before comparing so
+# sub-metre jitter does not count as a change and the payload carries fewer digits.
+
+POSITION_FIELDS = ("latitude", "longitude")
+DEFAULT_PRECISION = 4
+
+
+def quantize(flight, precision=DEFAULT_PRECISION):
+    row = dict(flight)
+    for field in POSITION_FIELDS:
+        if row[field] is not None:
+            row[field] = round(row[field], precision)
+    return row
+
+
+def diff_flights(old_rows, new_rows, precision=DEFAULT_PRECISION):
+    old_by_id = {f["id"]: f for f in old_rows}
+
+    added = []
+    changed = []
+    for flight in new_rows:
+        row = quantize(flight, precision)
+        prev = old_by_id.pop(flight["id"], None)
+        if prev is None:
+            added.append(row)
+            continue
+
+        prev = quantize(prev, precision)
+        delta = {k: v for k, v in row.items() if prev.get(k) != v}
+        if delta:
+            delta["id"] = flight["id"]
+            changed.append(delta)
+
+    # Whatever is left was in the old view but not the new one.
+    removed = list(old_by_id)
+
+    return {"added": added, "changed": changed, "removed": removed}
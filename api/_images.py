@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+
+import _metrics
+from _cache import CACHE_DIR
+from _reference import aircraft_family
+
+# Aircraft photos learned from every successful details lookup, persisted on disk
+# so all processes share them. Looked up from most to least specific:
+#   reg:<registration>  ->  fam:<airline ICAO>:<type family>  ->  air:<airline ICAO>
+
+IMAGE_TTL = float(os.environ.get("PASSAIR_IMAGE_TTL", str(7 * 24 * 3600)))
+IMAGE_MAX_ENTRIES = int(os.environ.get("PASSAIR_IMAGE_MAX_ENTRIES", "5000"))
+IMAGES_PATH = os.path.join(CACHE_DIR, "aircraft_images.json")
+
+_lock = threading.Lock()
+_state = {"key": None, "entries": {}}
+
+
+def _keys(registration=None, airline_icao=None, aircraft_code=None):
+    keys = []
+    if registration:
+        keys.append(f"reg:{registration.upper()}")
+    family = aircraft_family(aircraft_code)
+    if airline_icao and family:
+        keys.append(f"fam:{airline_icao.upper()}:{family}")
+    if airline_icao:
+        keys.append(f"air:{airline_icao.upper()}")
+    return keys
+
+
+def _file_key():
+    try:
+        st = os.stat(IMAGES_PATH)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _refresh():
+    # Pick up entries other processes have written since we last looked.
+    key = _file_key()
+    if key == _state["key"]:
+        return
+    try:
+        with open(IMAGES_PATH, 'r', encoding='utf-8') as f:
+            _state["entries"] = json.load(f)
+    except (OSError, ValueError):
+        _state["entries"] = {}
+    _state["key"] = key
+
+
+def _save():
+    entries = _state["entries"]
+    if len(entries) > IMAGE_MAX_ENTRIES:
+        # Evict the least recently used entries.
+        for key in sorted(entries, key=lambda k: entries[k][2])[:len(entries) - IMAGE_MAX_ENTRIES]:
+            del entries[key]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{IMAGES_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, separators=(",", ":"))
+    os.replace(tmp_path, IMAGES_PATH)
+    _state["key"] = _file_key()
+
+
+def lookup(registration=None, airline_icao=None, aircraft_code=None, include_airline=True):
+    keys = _keys(registration, airline_icao, aircraft_code)
+    if not include_airline:
+        keys = [k for k in keys if not k.startswith("air:")]
+
+    now = time.time()
+    with _lock:
+        _refresh()
+        for key in keys:
+            entry = _state["entries"].get(key)
+            if entry and now - entry[1] < IMAGE_TTL:
+                # Recency only matters for eviction, so it is not written back on reads.
+                entry[2] = now
+                _metrics.cache_result("images", "hit")
+                return entry[0]
+    _metrics.cache_result("images", "miss")
+    return None
+
+
+def learn(image_url, registration=None, airline_icao=None, aircraft_code=None):
+    learn_many([(image_url, registration, airline_icao, aircraft_code)])
+
+
+def learn_many(items):
+    # items: (image_url, registration, airline_icao, aircraft_code); one file write for all of them.
+    now = time.time()
+    with _lock:
+        _refresh()
+        entries = _state["entries"]
+        # Specific keys always take the newest photo; the airline-wide key keeps its first one.
+        changed = False
+        for image_url, registration, airline_icao, aircraft_code in items:
+            if not image_url:
+                continue
+            for key in _keys(registration, airline_icao, aircraft_code):
+                entry = entries.get(key)
+                if key.startswith("air:") and entry and now - entry[1] < IMAGE_TTL:
+                    continue
+                if not entry or entry[0] != image_url or now - entry[1] >= IMAGE_TTL / 2:
+                    entries[key] = [image_url, now, now]
+                    changed = True
+        if changed:
+            try:
+                _save()
+            except OSError:
+                pass
\ No newline at end of file
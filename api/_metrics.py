@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide hot-path instrumentation: per-stage timers, upstream calls, cache hit
+# ratios and response sizes. Rendered in the Prometheus text format by api/metrics.py,
+# and, with PASSAIR_SERVER_TIMING=1, also sent per request as a Server-Timing header.
+# Counters live in the process, so they are only meaningful under a long-running
+# server (scripts/serve_api.py); each serverless invocation starts from zero.
+
+SERVER_TIMING = os.environ.get("PASSAIR_SERVER_TIMING", "") not in ("", "0", "false")
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 10240, 102400, 512000, 1048576, 5242880)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "passair_requests_total": ("counter", "Handler calls by outcome.", None),
+    "passair_request_seconds": ("histogram", "Time spent inside a handler.", SECONDS_BUCKETS),
+    "passair_response_bytes": ("histogram", "Response body size.", BYTES_BUCKETS),
+    "passair_stage_seconds": ("histogram", "Time spent in one stage of a request.", SECONDS_BUCKETS),
+    "passair_upstream_calls_total": ("counter", "FlightRadar24 calls by method and outcome.", None),
+    "passair_upstream_seconds": ("histogram", "FlightRadar24 call latency.", SECONDS_BUCKETS),
+    "passair_cache_requests_total": ("counter", "Cache lookups by cache and result (hit, stale, miss).", None),
+    "passair_upstream_concurrency_limit": ("gauge", "Current adaptive limit on concurrent FlightRadar24 calls.", None),
+    "passair_upstream_breaker_state": ("gauge", "FlightRadar24 circuit breaker: 0 closed, 1 half-open, 2 open.", None),
+    "passair_snapshot_tiles": ("gauge", "Tiles the world snapshot is fetched as, after adaptive splits.", None),
+    "passair_snapshot_truncated_tiles": ("gauge", "Tiles still at the upstream result cap at the maximum split depth.", None),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_local = threading.local()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def cache_result(cache, result):
+    count("passair_cache_requests_total", cache=cache, result=result)
+
+
+def upstream_call(method, outcome, seconds):
+    count("passair_upstream_calls_total", method=method, outcome=outcome)
+    observe("passair_upstream_seconds", seconds, method=method)
+
+
+class RequestTrace:
+    __slots__ = ("handler", "start", "stages")
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.start = time.perf_counter()
+        self.stages = []
+
+    def server_timing(self):
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def begin(handler):
+    # Starts collecting stages for the request running on this thread.
+    trace = _local.trace = RequestTrace(handler)
+    return trace
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        observe("passair_stage_seconds", seconds, stage=name)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.stages.append((name, seconds))
+
+
+def send_server_timing(request_handler):
+    trace = getattr(_local, "trace", None)
+    if SERVER_TIMING and trace is not None:
+        request_handler.send_header('Server-Timing', trace.server_timing())
+
+
+def finish(body_size, ok=True):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return
+    _local.trace = None
+    count("passair_requests_total", handler=trace.handler, outcome="ok" if ok else "error")
+    observe("passair_request_seconds", time.perf_counter() - trace.start, handler=trace.handler)
+    observe("passair_response_bytes", body_size, handler=trace.handler)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render():
+    with _lock:
+        counters = dict(_counters)
+        counters.update(_gauges)
+        histograms = {key: ([*h[0]], h[1], h[2]) for key, h in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind in ("counter", "gauge"):
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+            continue
+
+        for (metric, labels), (bucket_counts, total, observed) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, bucket_count in zip(buckets, bucket_counts):
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {observed}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {observed}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
@@ -0,0 +1,36 @@
+import math
+import os
+
+# Dead reckoning between upstream refreshes: each flight keeps its heading and ground
+# speed along a great circle from where the snapshot last saw it.
+
+# Positions are never projected further than this past the snapshot, in seconds.
+MAX_EXTRAPOLATION = float(os.environ.get("PASSAIR_MAX_EXTRAPOLATION", "60"))
+
+EARTH_RADIUS_NM = 3440.065
+
+
+def project(lat, lon, heading, knots, seconds):
+    distance = knots * seconds / 3600.0 / EARTH_RADIUS_NM
+    lat1, lon1, bearing = math.radians(lat), math.radians(lon), math.radians(heading)
+
+    lat2 = math.asin(math.sin(lat1) * math.cos(distance) +
+                     math.cos(lat1) * math.sin(distance) * math.cos(bearing))
+    lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(distance) * math.cos(lat1),
+                             math.cos(distance) - math.sin(lat1) * math.sin(lat2))
+
+    return math.degrees(lat2), ((math.degrees(lon2) + 180) % 360) - 180
+
+
+def extrapolate(rows, elapsed):
+    # Moves rows (fresh dicts from a snapshot query) in place to `elapsed` seconds after the snapshot.
+    elapsed = min(max(float(elapsed), 0.0), MAX_EXTRAPOLATION)
+    if not elapsed:
+        return rows
+
+    for row in rows:
+        knots, heading = row["ground_speed"], row["heading"]
+        if not knots or heading is None or row["latitude"] is None or row["longitude"] is None:
+            continue
+        row["latitude"], row["longitude"] = project(row["latitude"], row["longitude"], heading, knots, elapsed)
+    return rows
@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+
+# Static reference data (airline codes, aircraft type families), loaded once per
+# process and indexed so row normalization is dictionary lookups, not regex scans.
+
+AIRLINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'airlines.json')
+
+# Family name -> ICAO type designators. Types not listed fall back to their 3-character prefix.
+AIRCRAFT_FAMILIES = {
+    "A220": ("BCS1", "BCS3", "A221", "A223"),
+    "A300": ("A306", "A30B", "A310"),
+    "A320": ("A318", "A319", "A320", "A321", "A19N", "A20N", "A21N"),
+    "A330": ("A332", "A333", "A337", "A338", "A339"),
+    "A340": ("A342", "A343", "A345", "A346"),
+    "A350": ("A359", "A35K"),
+    "A380": ("A388",),
+    "B717": ("B712",),
+    "B737": ("B731", "B732", "B733", "B734", "B735", "B736", "B737", "B738", "B739",
+             "B37M", "B38M", "B39M", "B3XM"),
+    "B747": ("B741", "B742", "B743", "B744", "B748", "B74S"),
+    "B757": ("B752", "B753"),
+    "B767": ("B762", "B763", "B764"),
+    "B777": ("B772", "B773", "B77L", "B77W", "B778", "B779"),
+    "B787": ("B788", "B789", "B78X"),
+    "E170": ("E170", "E175", "E75L", "E75S"),
+    "E190": ("E190", "E195", "E290", "E295"),
+    "ERJ": ("E135", "E145", "E35L"),
+    "ATR42": ("AT43", "AT44", "AT45", "AT46"),
+    "ATR72": ("AT72", "AT73", "AT75", "AT76"),
+    "CRJ": ("CRJ1", "CRJ2", "CRJ7", "CRJ9", "CRJX"),
+    "DH8": ("DH8A", "DH8B", "DH8C", "DH8D"),
+    "MD80": ("MD81", "MD82", "MD83", "MD87", "MD88", "MD90"),
+}
+
+_TYPE_FAMILY = {code: family for family, codes in AIRCRAFT_FAMILIES.items() for code in codes}
+
+# ICAO prefixes are three letters; IATA ones two characters, letters or digits ("G3", "4M").
+_FLIGHT_NUMBER = re.compile(r'^(?:([A-Z]{3})|([A-Z0-9]{2}))\d+')
+_TYPE_CODE = re.compile(r'[A-Z0-9]{3,4}')
+
+_lock = threading.Lock()
+_airlines = {"iata": None, "icao": None}
+
+
+def _load_airlines():
+    with _lock:
+        if _airlines["iata"] is None:
+            try:
+                with open(AIRLINES_PATH, 'r', encoding='utf-8') as f:
+                    airlines = json.load(f)
+            except (OSError, ValueError):
+                airlines = []
+            _airlines["icao"] = {a["icao"]: a for a in airlines if a.get("icao")}
+            _airlines["iata"] = {a["iata"]: a for a in airlines if a.get("iata")}
+    return _airlines
+
+
+def airline_by_iata(iata):
+    return _load_airlines()["iata"].get(iata) if iata else None
+
+
+def airline_by_icao(icao):
+    return _load_airlines()["icao"].get(icao) if icao else None
+
+
+def iata_to_icao(iata):
+    airline = airline_by_iata(iata)
+    return airline["icao"] if airline else None
+
+
+def icao_to_iata(icao):
+    airline = airline_by_icao(icao)
+    return airline["iata"] if airline else None
+
+
+@lru_cache(maxsize=8192)
+def parse_flight_number(flight_number):
+    # "LA3456" -> ("LA", "LAN"); "GLO1234" -> ("GLO", "GLO"); (None, None) if it doesn't parse.
+    if not flight_number or flight_number == "N/A":
+        return None, None
+    match = _FLIGHT_NUMBER.match(flight_number)
+    if not match:
+        return None, None
+    if match.group(1):
+        return match.group(1), match.group(1)
+    return match.group(2), iata_to_icao(match.group(2))
+
+
+@lru_cache(maxsize=2048)
+def aircraft_family(aircraft_code):
+    # "A20N" / "A320" / "Airbus A321-271NX (A21N)" -> "A320"; unknown types -> first 3 characters.
+    if not aircraft_code or aircraft_code == "N/A":
+        return None
+    codes = _TYPE_CODE.findall(aircraft_code.upper())
+    for code in codes:
+        family = _TYPE_FAMILY.get(code)
+        if family:
+            return family
+    return codes[0][:3] if codes else None
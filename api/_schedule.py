@@ -0,0 +1,111 @@
+import bisect
+import os
+import threading
+
+import _metrics
+import _upstream
+from _cache import TTLCache
+
+# Airport departure boards, cached per (airport, page). Every search from the same
+# origin shares these pages, and concurrent misses coalesce into one upstream call.
+
+SCHEDULE_TTL = float(os.environ.get("PASSAIR_SCHEDULE_TTL", "120"))
+SCHEDULE_PAGES = 6
+
+_pages = TTLCache(SCHEDULE_TTL, max_entries=int(os.environ.get("PASSAIR_SCHEDULE_PAGES_CACHED", "600")),
+                  name="schedule_pages")
+
+
+def extract_departures(details):
+    if details and 'airport' in details and 'pluginData' in details['airport']:
+        plugin_data = details['airport']['pluginData']
+        if 'schedule' in plugin_data and 'departures' in plugin_data['schedule']:
+            return plugin_data['schedule']['departures']['data'] or []
+    return []
+
+
+def seed_departure_page(airport_iata, page, departures):
+    _pages.set((airport_iata.upper(), page), departures)
+
+
+async def fetch_departure_page(fr_api, airport_iata, page=1):
+    key = (airport_iata.upper(), page)
+    departures = _pages.get(key)
+    if departures is not None:
+        return departures
+
+    async def load():
+        departures = extract_departures(await _upstream.call(fr_api.get_airport_details, airport_iata, page=page))
+        _pages.set(key, departures)
+        return departures
+
+    return await _upstream.coalesce(("departures",) + key, load)
+
+
+def get_departure_page(fr_api, airport_iata, page=1):
+    return _upstream.run(fetch_departure_page(fr_api, airport_iata, page))
+
+
+class RouteIndex:
+    # origin's departures grouped by destination, each group sorted by scheduled time.
+    __slots__ = ("pages", "routes")
+
+    def __init__(self, pages, normalize):
+        self.pages = pages
+        grouped = {}
+        seen = set()
+        for departures in pages:
+            for item in departures or ():
+                flight = item.get('flight')
+                if not flight:
+                    continue
+                dest = ((flight.get('airport') or {}).get('destination') or {}).get('code', {}).get('iata')
+                if not dest:
+                    continue
+
+                row = normalize(flight)
+                key = (row["flight_number"], row["time"]["scheduled"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                grouped.setdefault(dest, []).append(row)
+
+        self.routes = {}
+        for dest, rows in grouped.items():
+            rows.sort(key=lambda r: (r["time"]["scheduled"] is None, r["time"]["scheduled"] or 0))
+            times = [r["time"]["scheduled"] for r in rows if r["time"]["scheduled"] is not None]
+            self.routes[dest] = (times, rows)
+
+    def query(self, dest, start_ts=None, end_ts=None):
+        times, rows = self.routes.get(dest, ((), ()))
+        if start_ts is None and end_ts is None:
+            return list(rows)
+
+        lo = 0 if start_ts is None else bisect.bisect_left(times, start_ts)
+        hi = len(times) if end_ts is None else bisect.bisect_left(times, end_ts)
+        return rows[lo:hi]
+
+
+MAX_ROUTE_INDEXES = 200
+
+_route_indexes = {}
+_route_lock = threading.Lock()
+
+
+def get_route_index(origin, pages, normalize):
+    # Rebuilt only when one of the cached pages behind it has been refreshed.
+    origin = origin.upper()
+    with _route_lock:
+        index = _route_indexes.get(origin)
+    if index is None or len(index.pages) != len(pages) or any(a is not b for a, b in zip(index.pages, pages)):
+        _metrics.cache_result("route_index", "miss")
+        with _metrics.stage("route_index"):
+            index = RouteIndex(pages, normalize)
+        with _route_lock:
+            _route_indexes.pop(origin, None)
+            _route_indexes[origin] = index
+            while len(_route_indexes) > MAX_ROUTE_INDEXES:
+                del _route_indexes[next(iter(_route_indexes))]
+    else:
+        _metrics.cache_result("route_index", "hit")
+    return index
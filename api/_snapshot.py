@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+
+import _metrics
+from _cache import CACHE_DIR
+
+# Files starting with "_" are not deployed as endpoints, so shared helpers live here.
+# The snapshot is kept on disk so every worker process (and every one-shot CLI run
+# spawned by the Next.js routes) shares the same upstream fetch. It is also the
+# last-known-good copy: an expired snapshot is served (with its age) while one
+# background refresh runs, and stays in service for as long as upstream keeps failing.
+
+SNAPSHOT_TTL = float(os.environ.get("PASSAIR_SNAPSHOT_TTL", "8"))
+SNAPSHOT_WAIT = float(os.environ.get("PASSAIR_SNAPSHOT_WAIT", "5"))
+SNAPSHOT_HISTORY = int(os.environ.get("PASSAIR_SNAPSHOT_HISTORY", "3"))
+LOCK_TIMEOUT = 30
+
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, "flights_snapshot.json")
+LOCK_PATH = SNAPSHOT_PATH + ".lock"
+
+_memory = {"key": None, "snapshot": None}
+_history = {}
+_history_lock = threading.Lock()
+_background = {"thread": None}
+
+
+# Snapshots are stored column-wise: column -> (upstream attribute, default when empty).
+COLUMNS = {
+    "id": ("id", None),
+    "callsign": ("callsign", "N/A"),
+    "latitude": ("latitude", None),
+    "longitude": ("longitude", None),
+    "heading": ("heading", None),
+    "altitude": ("altitude", None),
+    "ground_speed": ("ground_speed", None),
+    "airline": ("airline_iata", "Unknown"),
+    "airline_icao": ("airline_icao", ""),
+    "aircraft": ("aircraft_code", "N/A"),
+    "origin": ("origin_airport_iata", "N/A"),
+    "destination": ("destination_airport_iata", "N/A"),
+    "flight_number": ("number", "N/A"),
+}
+
+# Output row field -> snapshot column, in response order ("speed" mirrors ground_speed).
+ROW_FIELDS = (
+    ("id", "id"), ("callsign", "callsign"), ("latitude", "latitude"), ("longitude", "longitude"),
+    ("heading", "heading"), ("altitude", "altitude"), ("ground_speed", "ground_speed"), ("speed", "ground_speed"),
+    ("airline", "airline"), ("airline_icao", "airline_icao"), ("aircraft", "aircraft"), ("origin", "origin"),
+    ("destination", "destination"), ("flight_number", "flight_number"),
+)
+
+
+def normalize_flights(flights):
+    # One pass per column; row dicts are only built later, for the flights a request returns.
+    columns = {}
+    for name, (attr, default) in COLUMNS.items():
+        values = [getattr(f, attr) for f in flights]
+        columns[name] = values if default is None else [v or default for v in values]
+    return columns
+
+
+def _read_snapshot():
+    try:
+        st = os.stat(SNAPSHOT_PATH)
+    except OSError:
+        return None
+
+    # Re-parse only when another process has replaced the file.
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if _memory["key"] == key:
+        return _memory["snapshot"]
+
+    try:
+        with _metrics.stage("snapshot_parse"), open(SNAPSHOT_PATH, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if "columns" not in snapshot:
+        # Written by an older row-wise version; treat it as missing so it gets refreshed.
+        return None
+
+    _memory["key"] = key
+    _memory["snapshot"] = snapshot
+    return snapshot
+
+
+def _history_path(version):
+    return os.path.join(CACHE_DIR, f"flights_snapshot.{version}.json")
+
+
+def _prune_history():
+    versions = []
+    for name in os.listdir(CACHE_DIR):
+        parts = name.split(".")
+        if len(parts) == 3 and parts[0] == "flights_snapshot" and parts[1].isdigit():
+            versions.append(int(parts[1]))
+
+    for version in sorted(versions)[:-SNAPSHOT_HISTORY]:
+        try:
+            os.remove(_history_path(version))
+        except OSError:
+            pass
+
+
+def _write_snapshot(snapshot):
+    tmp_path = f"{SNAPSHOT_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+
+    # Keep a few older versions around so delta requests can diff against them.
+    history_path = _history_path(snapshot["version"])
+    try:
+        os.link(tmp_path, history_path)
+    except OSError:
+        with open(history_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+
+    os.replace(tmp_path, SNAPSHOT_PATH)
+    _prune_history()
+
+
+def get_snapshot_version(version):
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        return None
+
+    current = _memory["snapshot"]
+    if current and current.get("version") == version:
+        return current
+    with _history_lock:
+        if version in _history:
+            return _history[version]
+
+    try:
+        with open(_history_path(version), 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if "columns" not in snapshot:
+        return None
+
+    with _history_lock:
+        _history[version] = snapshot
+        for old_version in sorted(_history)[:-SNAPSHOT_HISTORY]:
+            _history.pop(old_version, None)
+    return snapshot
+
+
+def _acquire_lock():
+    try:
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.stat(LOCK_PATH).st_mtime > LOCK_TIMEOUT:
+                # Left behind by a refresher that crashed; the next caller takes over.
+                os.remove(LOCK_PATH)
+        except OSError:
+            pass
+        return False
+
+
+def _release_lock():
+    try:
+        os.remove(LOCK_PATH)
+    except OSError:
+        pass
+
+
+def freshness(snapshot):
+    age = time.time() - snapshot["fetched_at"]
+    return {"updated_at": snapshot["fetched_at"], "age": round(age, 1), "stale": age >= SNAPSHOT_TTL}
+
+
+def _refresh(fetch_flights):
+    # Runs with the lock held, and releases it.
+    try:
+        flights = fetch_flights() or []
+        previous = _read_snapshot()
+        if not flights and previous and previous.get("count"):
+            # An empty world is an upstream hiccup, not news; keep the last good snapshot.
+            raise ValueError("FlightRadar24 returned no flights")
+        fetched_at = time.time()
+        with _metrics.stage("normalize"):
+            columns = normalize_flights(flights)
+        snapshot = {"version": int(fetched_at * 1000), "fetched_at": fetched_at, "count": len(flights),
+                    "columns": columns}
+        with _metrics.stage("snapshot_write"):
+            _write_snapshot(snapshot)
+        return _read_snapshot() or snapshot
+    finally:
+        _release_lock()
+
+
+def _refresh_in_background(fetch_flights):
+    def run():
+        try:
+            _refresh(fetch_flights)
+        except Exception:
+            pass
+
+    # Not a daemon, so it never leaves the lock behind; one-shot CLI runs still have to
+    # wait_for_refresh() before exiting.
+    thread = _background["thread"] = threading.Thread(target=run, name="snapshot-refresh")
+    thread.start()
+
+
+def wait_for_refresh():
+    # For one-shot CLI runs, once their output is written: at interpreter shutdown the
+    # upstream executor refuses new work, so a refresh still running then would fail
+    # and the next run would find the same stale snapshot.
+    thread = _background["thread"]
+    if thread is not None:
+        thread.join()
+
+
+def get_snapshot(fetch_flights, ttl=None):
+    ttl = SNAPSHOT_TTL if ttl is None else ttl
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    snapshot = _read_snapshot()
+    age = time.time() - snapshot["fetched_at"] if snapshot else None
+    if snapshot and age < ttl:
+        _metrics.cache_result("snapshot", "hit")
+        return snapshot
+
+    if snapshot:
+        # However old it is, serve it now. Whoever gets the lock starts the refresh; nobody
+        # waits for it, and while upstream keeps failing this snapshot stays in service.
+        if _acquire_lock():
+            _refresh_in_background(fetch_flights)
+        _metrics.cache_result("snapshot", "stale")
+        return snapshot
+
+    # Nothing to show yet: the first refresh is waited for.
+    if _acquire_lock():
+        _metrics.cache_result("snapshot", "miss")
+        return _refresh(fetch_flights)
+
+    deadline = time.time() + SNAPSHOT_WAIT
+    while time.time() < deadline:
+        time.sleep(0.1)
+        snapshot = _read_snapshot()
+        if snapshot:
+            return snapshot
+
+    raise TimeoutError("Timed out waiting for the flight snapshot")
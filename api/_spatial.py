@@ -0,0 +1,180 @@
+import math
+from array import array
+
+import _metrics
+from _cache import TTLCache
+from _snapshot import ROW_FIELDS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Viewport queries over a column-wise snapshot. Flights are ranked once per sort key
+# when the index is built; a query filters the ranked columns (vectorized with NumPy,
+# through a fixed lat/lon grid without it), and row dicts are only built for the
+# flights actually returned.
+
+CELL_SIZE = 2.0
+SORT_FIELDS = {
+    "altitude": "altitude",
+    "speed": "ground_speed",
+}
+
+_COLS = int(360 / CELL_SIZE)
+_ROWS = int(180 / CELL_SIZE)
+
+# A few snapshots are indexed at once so delta requests can query the base version too.
+MAX_INDEXES = 6
+
+# Entries never expire, they only age out; concurrent misses on one key share a single build.
+_indexes = TTLCache(float("inf"), max_entries=MAX_INDEXES, name="spatial_index")
+_tables = TTLCache(float("inf"), max_entries=MAX_INDEXES)
+
+
+def _row(lat):
+    return min(max(int((lat + 90) // CELL_SIZE), 0), _ROWS - 1)
+
+
+def _col(lon):
+    return min(max(int((lon + 180) // CELL_SIZE), 0), _COLS - 1)
+
+
+def _wrap_lon(lon):
+    return ((lon + 180) % 360) - 180
+
+
+def lon_ranges(min_lon, max_lon):
+    if max_lon - min_lon >= 360:
+        return [(-180.0, 180.0)]
+
+    west, east = _wrap_lon(min_lon), _wrap_lon(max_lon)
+    if west <= east:
+        return [(west, east)]
+    # Viewport crosses the antimeridian.
+    return [(west, 180.0), (-180.0, east)]
+
+
+class FlightTable:
+    __slots__ = ("columns", "count")
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.count = len(columns["id"])
+
+    def numeric(self, name, missing=math.nan):
+        values = [missing if v is None else v for v in self.columns[name]]
+        if np is not None:
+            return np.array(values, dtype=np.float64)
+        return array('d', values)
+
+    def row(self, i):
+        columns = self.columns
+        return {field: columns[column][i] for field, column in ROW_FIELDS}
+
+    def rows(self, positions):
+        return [self.row(i) for i in positions]
+
+
+class VectorIndex:
+    __slots__ = ("table", "order", "lat", "lon")
+
+    def __init__(self, table, sort_by="altitude"):
+        field = SORT_FIELDS.get(sort_by, "altitude")
+        lat = table.numeric("latitude")
+        lon = table.numeric("longitude")
+        located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+
+        values = table.numeric(field, 0.0)[located]
+        ids = np.array([v or "" for v in table.columns["id"]], dtype=str)[located]
+        order = located[np.lexsort((ids, -values))]
+
+        self.table = table
+        self.order = order
+        self.lat = lat[order]
+        self.lon = lon[order]
+
+    def query(self, min_lat, max_lat, min_lon, max_lon, limit=None):
+        min_lat, max_lat = float(min_lat), float(max_lat)
+        min_lon, max_lon = float(min_lon), float(max_lon)
+        if min_lat > max_lat:
+            min_lat, max_lat = max_lat, min_lat
+
+        lon_mask = np.zeros(len(self.order), dtype=bool)
+        for west, east in lon_ranges(min_lon, max_lon):
+            lon_mask |= (self.lon >= west) & (self.lon <= east)
+        hits = np.flatnonzero(lon_mask & (self.lat >= min_lat) & (self.lat <= max_lat))
+
+        return self.table.rows(self.order[hits[:limit]].tolist())
+
+    def top(self, limit=None):
+        return self.table.rows(self.order[:limit].tolist())
+
+
+class GridIndex:
+    __slots__ = ("table", "order", "lat", "lon", "cells")
+
+    def __init__(self, table, sort_by="altitude"):
+        field = SORT_FIELDS.get(sort_by, "altitude")
+        lat = table.numeric("latitude")
+        lon = table.numeric("longitude")
+        values = table.numeric(field, 0.0)
+        ids = table.columns["id"]
+
+        order = [i for i in range(table.count) if not (math.isnan(lat[i]) or math.isnan(lon[i]))]
+        order.sort(key=lambda i: (-values[i], ids[i] or ""))
+
+        self.table = table
+        self.order = order
+        self.lat = array('d', (lat[i] for i in order))
+        self.lon = array('d', (lon[i] for i in order))
+        self.cells = {}
+        for rank in range(len(order)):
+            self.cells.setdefault((_row(self.lat[rank]), _col(self.lon[rank])), []).append(rank)
+
+    def query(self, min_lat, max_lat, min_lon, max_lon, limit=None):
+        min_lat, max_lat = float(min_lat), float(max_lat)
+        min_lon, max_lon = float(min_lon), float(max_lon)
+        if min_lat > max_lat:
+            min_lat, max_lat = max_lat, min_lat
+
+        lat, lon = self.lat, self.lon
+        hits = []
+        for west, east in lon_ranges(min_lon, max_lon):
+            for row in range(_row(min_lat), _row(max_lat) + 1):
+                for col in range(_col(west), _col(east) + 1):
+                    for rank in self.cells.get((row, col), ()):
+                        if min_lat <= lat[rank] <= max_lat and west <= lon[rank] <= east:
+                            hits.append(rank)
+
+        hits.sort()
+        if limit is not None:
+            del hits[limit:]
+        return self.table.rows(self.order[rank] for rank in hits)
+
+    def top(self, limit=None):
+        return self.table.rows(self.order[:limit])
+
+
+def get_table(snapshot):
+    return _tables.get_or_load(snapshot["fetched_at"], lambda: FlightTable(snapshot["columns"]))
+
+
+def get_index(snapshot, sort_by="altitude"):
+    sort_by = sort_by if sort_by in SORT_FIELDS else "altitude"
+    key = (snapshot["fetched_at"], sort_by)
+
+    def build():
+        table = get_table(snapshot)
+        return VectorIndex(table, sort_by) if np is not None else GridIndex(table, sort_by)
+
+    return _indexes.get_or_load(key, build)
+
+
+def query_view(snapshot, min_lat=None, max_lat=None, min_lon=None, max_lon=None, limit=None, sort_by="altitude"):
+    index = get_index(snapshot, sort_by)
+
+    with _metrics.stage("query"):
+        if min_lat and max_lat and min_lon and max_lon:
+            return index.query(min_lat, max_lat, min_lon, max_lon, limit)
+        return index.top(limit)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+
+import _metrics
+import _upstream
+
+# The world snapshot is fetched as a fixed grid of tiles, each a bounded get_flights()
+# call, run in parallel and merged by flight id. A world-wide call comes back as one
+# payload that upstream truncates at its result cap; tiles that reach the cap are split
+# into quadrants and fetched again. The split is remembered for the next refresh, and
+# quadrants that have thinned out again (e.g. overnight) fold back into their parent.
+# Tiles still at the cap at TILE_MAX_DEPTH stay truncated and are counted in the metrics.
+#
+# A refresh every PASSAIR_SNAPSHOT_TTL takes one call per tile (18 on a quiet day, ~75
+# with dense regions split), so tile calls draw on a token bucket of their own instead
+# of the shared PASSAIR_UPSTREAM_RATE one, and details and board calls never queue
+# behind a refresh. Upstream sees up to UPSTREAM_RATE + TILE_RATE calls per second.
+
+TILE_DEGREES = float(os.environ.get("PASSAIR_TILE_DEGREES", "60"))  # 0 = one world-wide call
+TILE_RESULT_CAP = int(os.environ.get("PASSAIR_TILE_RESULT_CAP", "1500"))
+TILE_MAX_DEPTH = int(os.environ.get("PASSAIR_TILE_MAX_DEPTH", "4"))
+# Tile calls one refresh may have in flight (out of the process-wide upstream limit).
+TILE_CONCURRENCY = int(os.environ.get("PASSAIR_TILE_CONCURRENCY", "8"))
+# Sized so a split-up world (~75 tiles) fits in the burst and refills within the 8s TTL.
+TILE_RATE = float(os.environ.get("PASSAIR_TILE_RATE", "20"))
+TILE_BURST = int(os.environ.get("PASSAIR_TILE_BURST", "100"))
+
+_state = {"tiles": None, "parents": {}}
+_bucket = _upstream.TokenBucket(TILE_RATE, TILE_BURST)
+
+
+def world_tiles(degrees=TILE_DEGREES):
+    # (north, south, west, east, depth)
+    tiles = []
+    south = -90.0
+    while south < 90:
+        north = min(south + degrees, 90.0)
+        west = -180.0
+        while west < 180:
+            east = min(west + degrees, 180.0)
+            tiles.append((north, south, west, east, 0))
+            west = east
+        south = north
+    return tiles
+
+
+def split_tile(tile):
+    north, south, west, east, depth = tile
+    mid_lat, mid_lon = (north + south) / 2, (west + east) / 2
+    children = [(north, mid_lat, west, mid_lon, depth + 1), (north, mid_lat, mid_lon, east, depth + 1),
+                (mid_lat, south, west, mid_lon, depth + 1), (mid_lat, south, mid_lon, east, depth + 1)]
+    for child in children:
+        _state["parents"][child] = tile
+    return children
+
+
+def merge_sparse(counts, truncated=()):
+    # counts: leaf tile -> flights it returned. Sibling quadrants that together fit
+    # in half the cap, none of them truncated, are fetched as their parent next time.
+    siblings = {}
+    for tile in counts:
+        parent = _state["parents"].get(tile)
+        if parent is not None:
+            siblings.setdefault(parent, []).append(tile)
+
+    tiles = set(counts)
+    for parent, children in siblings.items():
+        if len(children) == 4 and not any(c in truncated for c in children) and \
+                sum(counts[c] for c in children) < TILE_RESULT_CAP // 2:
+            tiles.difference_update(children)
+            tiles.add(parent)
+    return sorted(tiles, key=lambda t: (-t[0], t[2]))
+
+
+def tile_bounds(tile):
+    # FlightRadar24's "north,south,west,east"
+    north, south, west, east, _ = tile
+    return f"{north:g},{south:g},{west:g},{east:g}"
+
+
+async def fetch_tiles(fr_api, tiles):
+    slots = asyncio.Semaphore(TILE_CONCURRENCY)
+    merged = {}
+    leaves = {}
+    failed = []
+    truncated = []
+
+    async def fetch(tile):
+        async with slots:
+            return await _upstream.call(fr_api.get_flights, bounds=tile_bounds(tile), bucket=_bucket)
+
+    pending = tiles
+    while pending:
+        results = await _upstream.gather([fetch(tile) for tile in pending])
+        dense = []
+        for tile, flights in zip(pending, results):
+            if flights is None:
+                failed.append(tile)
+                continue
+            # Tiles share their edges, so a flight on one can come back twice.
+            for f in flights:
+                merged[f.id or id(f)] = f
+            if len(flights) < TILE_RESULT_CAP:
+                leaves[tile] = len(flights)
+            elif tile[4] < TILE_MAX_DEPTH:
+                # Probably truncated: its quadrants go out in the next round.
+                dense.extend(split_tile(tile))
+            else:
+                # Still at the cap and as small as tiles get: coverage here is incomplete.
+                leaves[tile] = len(flights)
+                truncated.append(tile)
+        pending = dense
+
+    return list(merged.values()), leaves, failed, truncated
+
+
+def fetch_world(fr_api):
+    if TILE_DEGREES <= 0:
+        return _upstream.request(fr_api.get_flights)
+
+    flights, leaves, failed, truncated = _upstream.run(fetch_tiles(fr_api, _state["tiles"] or world_tiles()))
+    # Failed tiles stay as they are; they count as dense so they are never folded away.
+    _state["tiles"] = merge_sparse({**leaves, **{tile: TILE_RESULT_CAP for tile in failed}}, set(truncated))
+    _metrics.set_gauge("passair_snapshot_tiles", len(_state["tiles"]))
+    _metrics.set_gauge("passair_snapshot_truncated_tiles", len(truncated))
+
+    if failed:
+        # A hole in the map is worse than an older snapshot; get_snapshot keeps the last good one.
+        raise _upstream.UpstreamUnavailable(f"FlightRadar24 failed for {len(failed)} of "
+                                            f"{len(leaves) + len(failed)} tiles")
+    return flights
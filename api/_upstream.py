@@ -0,0 +1,298 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import os
+import threading
+import time
+
+import _metrics
+
+# Shared upstream I/O core: one asyncio loop per process, running on its own thread,
+# schedules every FlightRadar24 call with a process-wide concurrency limit, per-call
+# timeouts and real cancellation (calls still waiting for a slot never start).
+# The FlightRadar24 packages are blocking, so the calls themselves run on one shared
+# executor sized to that limit instead of on ad-hoc per-request thread pools.
+#
+# In front of every call sit, in order: a circuit breaker that fails fast while upstream
+# is down, a token bucket capping the call rate, and an AIMD concurrency limit that
+# grows while calls are fast and halves on errors, timeouts or slow calls.
+#
+# Handlers stay synchronous and enter through request() / run().
+
+UPSTREAM_CONCURRENCY = int(os.environ.get("PASSAIR_UPSTREAM_CONCURRENCY", "16"))
+UPSTREAM_TIMEOUT = float(os.environ.get("PASSAIR_UPSTREAM_TIMEOUT", "30"))
+UPSTREAM_MIN_CONCURRENCY = int(os.environ.get("PASSAIR_UPSTREAM_MIN_CONCURRENCY", "2"))
+# Calls slower than this count against the concurrency limit like errors do.
+UPSTREAM_TARGET_LATENCY = float(os.environ.get("PASSAIR_UPSTREAM_TARGET_LATENCY", "3"))
+# Sustained calls per second and burst size; a rate of 0 turns the bucket off.
+UPSTREAM_RATE = float(os.environ.get("PASSAIR_UPSTREAM_RATE", "10"))
+UPSTREAM_BURST = int(os.environ.get("PASSAIR_UPSTREAM_BURST", "20"))
+BREAKER_FAILURES = int(os.environ.get("PASSAIR_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("PASSAIR_BREAKER_COOLDOWN", "30"))
+
+_lock = threading.Lock()
+_state = {"loop": None, "executor": None, "limit": None, "bucket": None, "breaker": None}
+_inflight = {}
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+def is_failure(error):
+    # Whether an exception says something about upstream health (vs. e.g. an unknown flight id).
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, OSError) or "Cloudflare" in type(error).__name__
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def take(self, deadline=None):
+        # deadline: time.monotonic() by which a token must be had, else asyncio.TimeoutError.
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(wait)
+
+
+class AdaptiveLimit:
+    # Additive increase (about one slot per limit's worth of fast calls), multiplicative
+    # decrease (halved, at most once per target latency so one burst of errors counts once).
+    # A slot is held until the blocking call behind it returns, not just until its caller
+    # stops waiting, so the limit always matches the work really in flight upstream.
+    # Only touched from the loop thread, so it needs no lock.
+
+    def __init__(self, maximum, minimum, target_latency):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.target_latency = target_latency
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.waiters = collections.deque()
+        self.decreased_at = 0.0
+        _metrics.set_gauge("passair_upstream_concurrency_limit", self.limit)
+
+    async def acquire(self, deadline=None):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                if deadline is None:
+                    await waiter
+                else:
+                    await asyncio.wait_for(waiter, max(deadline - time.monotonic(), 0))
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def record(self, latency, ok):
+        if ok and latency <= self.target_latency:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._wake()
+        else:
+            now = time.monotonic()
+            if now - self.decreased_at < self.target_latency:
+                return
+            self.decreased_at = now
+            self.limit = max(self.minimum, self.limit / 2)
+        _metrics.set_gauge("passair_upstream_concurrency_limit", self.limit)
+
+
+class CircuitBreaker:
+    # closed -> open after `failures` consecutive failures; open -> half-open after
+    # `cooldown`, letting a single trial call through; its outcome closes or reopens.
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failures, cooldown):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.trial = False
+        _metrics.set_gauge("passair_upstream_breaker_state", self.state)
+
+    def _set(self, state):
+        self.state = state
+        _metrics.set_gauge("passair_upstream_breaker_state", state)
+
+    def allow(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self._set(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def retry_in(self):
+        return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def record(self, failed):
+        # failed: True / False, or None when the call ended without telling us anything.
+        self.trial = False
+        if failed is None:
+            return
+        if not failed:
+            self.consecutive = 0
+            if self.state != self.CLOSED:
+                self._set(self.CLOSED)
+            return
+        self.consecutive += 1
+        if self.state == self.HALF_OPEN or self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+
+def _start():
+    with _lock:
+        if _state["loop"] is None:
+            loop = asyncio.new_event_loop()
+            _state["executor"] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=UPSTREAM_CONCURRENCY, thread_name_prefix="upstream")
+            _state["limit"] = AdaptiveLimit(UPSTREAM_CONCURRENCY, UPSTREAM_MIN_CONCURRENCY, UPSTREAM_TARGET_LATENCY)
+            _state["bucket"] = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
+            _state["breaker"] = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+            threading.Thread(target=loop.run_forever, name="upstream-loop", daemon=True).start()
+            _state["loop"] = loop
+        return _state["loop"]
+
+
+async def call(fn, *args, timeout=None, bucket=None, **kwargs):
+    # Runs a blocking upstream call once the breaker, rate and concurrency limits allow;
+    # bucket replaces the shared token bucket for callers with a rate budget of their own.
+    # Raises UpstreamUnavailable straight away while the breaker is open. timeout covers
+    # the wait for a token and a slot as well as the call; past it the caller stops
+    # waiting, and a call already on the wire finishes in the background, keeping its slot.
+    timeout = UPSTREAM_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    loop = asyncio.get_running_loop()
+    method = getattr(fn, "__name__", "call")
+    breaker, limit = _state["breaker"], _state["limit"]
+
+    if not breaker.allow():
+        _metrics.upstream_call(method, "rejected", 0.0)
+        raise UpstreamUnavailable(f"FlightRadar24 unavailable, retrying in {breaker.retry_in():.0f}s")
+
+    failed = None
+    try:
+        try:
+            await (bucket or _state["bucket"]).take(deadline)
+            await limit.acquire(deadline)
+        except asyncio.TimeoutError:
+            # Never reached upstream, so it says nothing about upstream health.
+            _metrics.upstream_call(method, "throttled", 0.0)
+            raise
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            work = loop.run_in_executor(_state["executor"], functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            limit.release()
+            raise
+        work.add_done_callback(functools.partial(_finished, limit))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(work), max(deadline - time.monotonic(), 0))
+            outcome = "ok"
+            failed = False
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            failed = True
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            failed = is_failure(e)
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            _metrics.upstream_call(method, outcome, latency)
+            if failed is not None:
+                limit.record(latency, not failed)
+    finally:
+        breaker.record(failed)
+
+
+def _finished(limit, work):
+    limit.release()
+    # Retrieved so calls nobody waits for any more don't log "exception never retrieved".
+    if not work.cancelled():
+        work.exception()
+
+
+async def coalesce(key, factory):
+    # Concurrent awaits of the same key share one task; one waiter giving up doesn't cancel it.
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda t: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def gather(calls, timeout=None):
+    # calls: coroutines. Failed ones, and ones still running after timeout seconds
+    # (which are cancelled), come back as None, in order.
+    tasks = [asyncio.ensure_future(c) for c in calls]
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return [None if task not in done or task.cancelled() or task.exception() else task.result() for task in tasks]
+
+
+def run(coro, timeout=None):
+    # Blocking bridge from handler threads into the upstream loop.
+    future = asyncio.run_coroutine_threadsafe(coro, _start())
+    with _metrics.stage("upstream"):
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+def request(fn, *args, timeout=None, **kwargs):
+    return run(call(fn, *args, timeout=timeout, **kwargs))
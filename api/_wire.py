@@ -0,0 +1,143 @@
+import json
+import math
+import struct
+import sys
+from array import array
+
+# Compact encodings for bulk flight lists, opt-in through ?format= or Accept.
+# "speed" is left out of both: it always mirrors ground_speed.
+
+JSON = "json"
+COLUMNAR = "columnar"
+BINARY = "binary"
+
+COLUMNAR_TYPE = "application/vnd.passair.columnar+json"
+BINARY_TYPE = "application/vnd.passair.flights"
+
+STRING_FIELDS = ("id", "callsign", "flight_number", "airline", "airline_icao", "aircraft", "origin", "destination")
+FLOAT_FIELDS = ("latitude", "longitude", "heading")
+INT_FIELDS = ("altitude", "ground_speed")
+COLUMN_FIELDS = STRING_FIELDS + FLOAT_FIELDS + INT_FIELDS
+
+# Binary layout, little-endian:
+#   header  "PAF1", u32 row count, u64 snapshot version, f64 time of the positions
+#           (the ?at= time when extrapolated, else updated_at)
+#   strings u32 count, then per string u16 byte length + UTF-8 bytes
+#   columns one u32 string-table index per row for each STRING_FIELDS entry,
+#           float32 per row for FLOAT_FIELDS (NaN = missing),
+#           int32 per row for INT_FIELDS (INT_NULL = missing)
+MAGIC = b"PAF1"
+HEADER = struct.Struct("<4sIQd")
+INT_NULL = -2 ** 31
+
+
+def negotiate(fmt=None, accept=None):
+    if fmt in (JSON, COLUMNAR, BINARY):
+        return fmt
+
+    accept = accept or ""
+    if BINARY_TYPE in accept:
+        return BINARY
+    if COLUMNAR_TYPE in accept:
+        return COLUMNAR
+    return JSON
+
+
+def to_columns(rows):
+    return {field: [row[field] for row in rows] for field in COLUMN_FIELDS}
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def encode_binary(rows, version=0, updated_at=0.0):
+    strings = []
+    string_ids = {}
+
+    def intern(value):
+        value = "" if value is None else str(value)
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            raw = value.encode('utf-8')
+            if len(raw) > 0xFFFF:
+                # Cut on a character boundary so the decoder never sees half a character.
+                raw = raw[:0xFFFF].decode('utf-8', 'ignore').encode('utf-8')
+            strings.append(raw)
+        return idx
+
+    string_columns = [_pack("I", [intern(row[field]) for row in rows]) for field in STRING_FIELDS]
+
+    parts = [HEADER.pack(MAGIC, len(rows), int(version or 0), float(updated_at or 0.0)),
+             struct.pack("<I", len(strings))]
+    for raw in strings:
+        parts.append(struct.pack("<H", len(raw)))
+        parts.append(raw)
+
+    parts.extend(string_columns)
+    for field in FLOAT_FIELDS:
+        parts.append(_pack("f", [math.nan if row[field] is None else row[field] for row in rows]))
+    for field in INT_FIELDS:
+        parts.append(_pack("i", [INT_NULL if row[field] is None else int(row[field]) for row in rows]))
+
+    return b"".join(parts)
+
+
+def _unpack(typecode, buf, offset, count):
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(buf[offset:end])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values, end
+
+
+def decode_binary(buf):
+    magic, count, version, updated_at = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a PassAir flight payload")
+    offset = HEADER.size
+
+    (n_strings,) = struct.unpack_from("<I", buf, offset)
+    offset += 4
+    strings = []
+    for _ in range(n_strings):
+        (length,) = struct.unpack_from("<H", buf, offset)
+        offset += 2
+        strings.append(bytes(buf[offset:offset + length]).decode('utf-8'))
+        offset += length
+
+    columns = {}
+    for field in STRING_FIELDS:
+        values, offset = _unpack("I", buf, offset, count)
+        columns[field] = [strings[i] for i in values]
+    for field in FLOAT_FIELDS:
+        values, offset = _unpack("f", buf, offset, count)
+        columns[field] = [None if math.isnan(v) else v for v in values]
+    for field in INT_FIELDS:
+        values, offset = _unpack("i", buf, offset, count)
+        columns[field] = [None if v == INT_NULL else v for v in values]
+
+    rows = [{field: columns[field][i] for field in COLUMN_FIELDS} for i in range(count)]
+    for row in rows:
+        row["speed"] = row["ground_speed"]
+    return {"version": version, "updated_at": updated_at, "data": rows}
+
+
+def encode_result(result, fmt=JSON):
+    # Only full listings change shape; errors and deltas are always plain JSON.
+    if fmt != JSON and result.get("success") and "data" in result:
+        if fmt == BINARY:
+            positions_at = result.get("at") or result.get("updated_at")
+            return encode_binary(result["data"], result.get("version"), positions_at), BINARY_TYPE
+
+        columnar = dict(result)
+        columnar["data"] = to_columns(result["data"])
+        columnar["format"] = COLUMNAR
+        return json.dumps(columnar).encode('utf-8'), COLUMNAR_TYPE
+
+    return json.dumps(result).encode('utf-8'), 'application/json'
@@ -1,50 +1,45 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
+import sys
 import json
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _airports import search_airports
+
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("airports")
         try:
             query_params = parse_qs(urlparse(self.path).query)
             q = query_params.get('q', [''])[0].lower()
             
             if not q or len(q) < 2:
+                body = json.dumps({"success": True, "data": []}).encode('utf-8')
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
+                _metrics.send_server_timing(self)
                 self.end_headers()
-                self.wfile.write(json.dumps({"success": True, "data": []}).encode('utf-8'))
+                self.wfile.write(body)
+                _metrics.finish(len(body))
                 return
 
             
-            json_path = os.path.join(os.path.dirname(__file__), 'data', 'airports.json')
-            
-            with open(json_path, 'r', encoding='utf-8') as f:
-                airports = json.load(f)
-            
-           
-            results = []
-            count = 0
-            limit = 10
-            
-            for airport in airports:
-                
-                if (q in airport['iata'].lower() or 
-                    q in airport['name'].lower() or 
-                    q in airport['city'].lower()):
-                    
-                    results.append(airport)
-                    count += 1
-                    if count >= limit:
-                        break
+            with _metrics.stage("search"):
+                results = search_airports(q, limit=10)
+            body = json.dumps({"success": True, "data": results}).encode('utf-8')
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            _metrics.send_server_timing(self)
             self.end_headers()
-            self.wfile.write(json.dumps({"success": True, "data": results}).encode('utf-8'))
+            self.wfile.write(body)
+            _metrics.finish(len(body))
             
         except Exception as e:
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps({"success": False, "error": str(e)}).encode('utf-8'))
+            _metrics.finish(0, False)
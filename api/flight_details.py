@@ -1,184 +1,260 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sys
+import os
 import json
-import concurrent.futures
+import time
+import threading
+import asyncio
 
-flight_api_error = None
-try:
-    from FlightRadar24 import FlightRadar24API
-except ImportError as e1:
-    try:
-        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
-    except ImportError as e2:
-        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _client import get_api, flight_api_error
+import _images
+import _upstream
+from _cache import SWRCache
+from _reference import aircraft_family
+
+# How long the image fallback may spend on candidate details calls, in seconds.
+IMAGE_SEARCH_BUDGET = float(os.environ.get("PASSAIR_IMAGE_BUDGET", "2.5"))
+# Candidate details calls one lookup may have in flight (out of the process-wide upstream limit).
+IMAGE_SEARCH_CONCURRENCY = 5
+# Details are served from here for DETAILS_TTL, then stale (with their age) while one
+# background refresh runs; the last good copy also covers for upstream outages.
+DETAILS_TTL = float(os.environ.get("PASSAIR_DETAILS_TTL", "60"))
+
+_details = SWRCache(DETAILS_TTL, max_entries=1000, name="flight_details")
+
+# Last-resort photos by (airline ICAO, aircraft family).
+STATIC_IMAGES = {
+    ("LAN", "A320"): "https://cdn.jetphotos.com/400/5/889433_1745494364.jpg?v=0", # LATAM A320 fam
+    ("TAM", "A320"): "https://cdn.jetphotos.com/400/5/889433_1745494364.jpg?v=0", # LATAM A320 fam
+    ("GLO", "B737"): "https://cdn.jetphotos.com/400/5/1166417_1755987529.jpg?v=0", # GOL 737 fam
+    ("AZU", "E190"): "https://cdn.jetphotos.com/400/5/818842_1758043089.jpg?v=0", # Azul E195
+    ("AZU", "ATR72"): "https://cdn.jetphotos.com/400/6/1353548_1752808693.jpg?v=0", # Azul ATR
+    ("AZU", "A320"): "https://cdn.jetphotos.com/400/6/58970_1697983802.jpg?v=0",  # Azul A320
+    ("ETH", "B787"): "https://cdn.jetphotos.com/400/5/449518_1760903836.jpg?v=0", # Ethiopian 787
+    ("ETH", "B777"): "https://cdn.jetphotos.com/400/6/78609_1709488842.jpg?v=0", # Ethiopian 777
+    ("TAP", "A330"): "https://cdn.jetphotos.com/400/5/441714_1761435923.jpg?v=0", # TAP A330
+    ("TAP", "A320"): "https://cdn.jetphotos.com/400/6/22683_1666548866.jpg?v=0", # TAP A321
+    ("AVA", "A320"): "https://cdn.jetphotos.com/400/6/1162486_1755630182.jpg?v=0", # Avianca A320
+    ("AAL", "B777"): "https://cdn.jetphotos.com/400/6/59532_1683418982.jpg?v=0", # American 777
+    ("UAL", "B777"): "https://cdn.jetphotos.com/400/6/37635_1695085682.jpg?v=0", # United 777
+    ("DAL", "A330"): "https://cdn.jetphotos.com/400/6/95562_1694905682.jpg?v=0", # Delta A330
+}
 
 class DummyFlight:
     def __init__(self, id):
         self.id = id
 
 
-def get_flight_details_data(flight_id, airline_icao=None, aircraft_code=None):
-    if flight_api_error:
-        return {"success": False, "error": f"Import Error: {flight_api_error}"}
+def match_rank(target_code, candidate_code):
+    # 0: same type, 1: same family (A320 / B737 / ...), 2: anything else.
+    if not target_code or not candidate_code:
+        return 2
+    if target_code in candidate_code or candidate_code in target_code:
+        return 0
+    if aircraft_family(target_code) == aircraft_family(candidate_code):
+        return 1
+    return 2
 
-    try:
-        fr_api = FlightRadar24API()
-        
-        data = {}
-        image_url = None
 
-        if len(flight_id) <= 16:
-            try:
-                flight_obj = DummyFlight(flight_id)
-                flight = fr_api.get_flight_details(flight_obj)
-                
-                if flight and "aircraft" in flight:
-                    if "images" in flight["aircraft"] and flight["aircraft"]["images"]:
-                        images = flight["aircraft"]["images"]
-                        if "medium" in images and len(images["medium"]) > 0:
-                            image_url = images["medium"][0]["src"]
-                        elif "large" in images and len(images["large"]) > 0:
-                            image_url = images["large"][0]["src"]
-                    
-                    if "airline" in flight and flight["airline"]:
-                        data["airline"] = flight["airline"].get("name")
-                    if "aircraft" in flight and flight["aircraft"]:
-                        data["aircraft_model"] = flight["aircraft"].get("model", {}).get("text")
-                    if "airport" in flight and flight["airport"]:
-                        if "origin" in flight["airport"]:
-                            data["origin"] = flight["airport"]["origin"].get("name")
-                        if "destination" in flight["airport"]:
-                            data["destination"] = flight["airport"]["destination"].get("name")
-                    if "status" in flight and flight["status"]:
-                        data["status"] = flight["status"].get("text")
-                    
-                    # Extract airline logo if available in details
-                    if "airline" in flight and flight["airline"]:
-                        airline_data = flight["airline"]
-                        airline_iata = airline_data.get("code", {}).get("iata")
-                        airline_icao_code = airline_data.get("code", {}).get("icao")
-                        logo_code = airline_iata or airline_icao_code
-                        if logo_code:
-                            data["airline_logo"] = f"https://pics.avs.io/200/200/{logo_code}.png"
+async def search_images(candidates, target_code, check_candidate, budget):
+    # Returns (best match, first image seen). Candidates still waiting for a slot when a
+    # match turns up or the budget runs out are cancelled and never reach upstream.
+    slots = asyncio.Semaphore(IMAGE_SEARCH_CONCURRENCY)
 
-            except Exception:
-                pass
+    async def check(f):
+        async with slots:
+            return await _upstream.call(check_candidate, f, timeout=budget)
 
-        if not image_url and airline_icao:
+    tasks = [asyncio.ensure_future(check(f)) for f in candidates]
+    fallback_image = None
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=budget):
             try:
+                result = await next_done
+            except asyncio.TimeoutError:
+                # Out of budget: go with the best image seen so far.
+                break
+            except Exception:
+                continue
+            if not result:
+                continue
+            f_obj, img_src = result
+
+            if not fallback_image:
+                fallback_image = img_src
+
+            if not target_code or match_rank(target_code, f_obj.aircraft_code or "") < 2:
+                return img_src, fallback_image
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return None, fallback_image
+
+
+def upstream_down(error):
+    return isinstance(error, _upstream.UpstreamUnavailable) or _upstream.is_failure(error)
+
+
+def local_image(airline_icao, aircraft_code):
+    # What we know without asking upstream: the static table for this type, then any
+    # image learned for the airline.
+    if not airline_icao:
+        return None
+    return STATIC_IMAGES.get((airline_icao.upper(), aircraft_family(aircraft_code))) or \
+        _images.lookup(None, airline_icao, None)
+
+
+def load_flight_details(flight_id, airline_icao=None, aircraft_code=None, budget=None):
+    fr_api = get_api()
+    
+    data = {}
+    image_url = None
+    first_image = None
+    registration = None
+
+    if len(flight_id) <= 16:
+        try:
+            flight_obj = DummyFlight(flight_id)
+            flight = _upstream.request(fr_api.get_flight_details, flight_obj)
+            
+            if flight and "aircraft" in flight:
+                if "images" in flight["aircraft"] and flight["aircraft"]["images"]:
+                    images = flight["aircraft"]["images"]
+                    if "medium" in images and len(images["medium"]) > 0:
+                        image_url = images["medium"][0]["src"]
+                    elif "large" in images and len(images["large"]) > 0:
+                        image_url = images["large"][0]["src"]
                 
-                flights = fr_api.get_flights(airline=airline_icao)
-                flights = flights[:15] 
+                registration = flight["aircraft"].get("registration")
+                if image_url:
+                    _images.learn(image_url, registration,
+                                  ((flight.get("airline") or {}).get("code") or {}).get("icao") or airline_icao,
+                                  (flight["aircraft"].get("model") or {}).get("code") or aircraft_code)
                 
-                candidate_image = None
-                fallback_image = None
+                if "airline" in flight and flight["airline"]:
+                    data["airline"] = flight["airline"].get("name")
+                if "aircraft" in flight and flight["aircraft"]:
+                    data["aircraft_model"] = flight["aircraft"].get("model", {}).get("text")
+                if "airport" in flight and flight["airport"]:
+                    if "origin" in flight["airport"]:
+                        data["origin"] = flight["airport"]["origin"].get("name")
+                    if "destination" in flight["airport"]:
+                        data["destination"] = flight["airport"]["destination"].get("name")
+                if "status" in flight and flight["status"]:
+                    data["status"] = flight["status"].get("text")
                 
-                target_simplified = None
-                if aircraft_code and aircraft_code != "N/A":
-                    import re
-                    
-                    match = re.search(r'([A-Z0-9]{3,4})', aircraft_code)
-                    if match:
-                        target_simplified = match.group(1)
-
-                def check_candidate(f):
-                    try:
-                       
-                        details = fr_api.get_flight_details(f)
-                        if 'aircraft' in details and 'images' in details['aircraft']:
-                            images = details['aircraft']['images']
-                            img_src = None
-                            if 'medium' in images and len(images['medium']) > 0:
-                                img_src = images['medium'][0]['src']
-                            elif 'large' in images and len(images['large']) > 0:
-                                img_src = images['large'][0]['src']
-                            
-                            if img_src:
-                                return (f, img_src)
-                    except:
-                        pass
-                    return None
-
-                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                    results = list(executor.map(check_candidate, flights))
-
-                for result in results:
-                    if result:
-                        f_obj, img_src = result
-                        
-                       
-                        if not fallback_image:
-                            fallback_image = img_src
-                        
-                        
-                        if target_simplified:
-                            candidate_code = f_obj.aircraft_code or ""
-                            
-                           
-                            if target_simplified in candidate_code or candidate_code in target_simplified:
-                                candidate_image = img_src
-                                break
-                            
-                           
-                            if "A32" in target_simplified and "A32" in candidate_code: # A320 family
-                                candidate_image = img_src
-                                break
-                            if "B73" in target_simplified and "B73" in candidate_code: # B737 family
-                                candidate_image = img_src
-                                break
-                
-                image_url = candidate_image or fallback_image
-                                
-            except Exception as e:
-                
-                pass
-
-       
-        if not image_url and airline_icao:
-            STATIC_IMAGES = {
-                "LAN_A32": "https://cdn.jetphotos.com/400/5/889433_1745494364.jpg?v=0", # LATAM A320 fam
-                "TAM_A32": "https://cdn.jetphotos.com/400/5/889433_1745494364.jpg?v=0", # LATAM A320 fam
-                "GLO_B73": "https://cdn.jetphotos.com/400/5/1166417_1755987529.jpg?v=0", # GOL 737 fam
-                "AZU_E19": "https://cdn.jetphotos.com/400/5/818842_1758043089.jpg?v=0", # Azul E195
-                "AZU_AT7": "https://cdn.jetphotos.com/400/6/1353548_1752808693.jpg?v=0", # Azul ATR
-                "AZU_A32": "https://cdn.jetphotos.com/400/6/58970_1697983802.jpg?v=0",  # Azul A320
-                "ETH_B78": "https://cdn.jetphotos.com/400/5/449518_1760903836.jpg?v=0", # Ethiopian 787
-                "ETH_B77": "https://cdn.jetphotos.com/400/6/78609_1709488842.jpg?v=0", # Ethiopian 777
-                "TAP_A33": "https://cdn.jetphotos.com/400/5/441714_1761435923.jpg?v=0", # TAP A330
-                "TAP_A32": "https://cdn.jetphotos.com/400/6/22683_1666548866.jpg?v=0", # TAP A321
-                "AVA_A32": "https://cdn.jetphotos.com/400/6/1162486_1755630182.jpg?v=0", # Avianca A320
-                "AAL_B77": "https://cdn.jetphotos.com/400/6/59532_1683418982.jpg?v=0", # American 777
-                "UAL_B77": "https://cdn.jetphotos.com/400/6/37635_1695085682.jpg?v=0", # United 777
-                "DAL_A33": "https://cdn.jetphotos.com/400/6/95562_1694905682.jpg?v=0", # Delta A330
-            }
+                # Extract airline logo if available in details
+                if "airline" in flight and flight["airline"]:
+                    airline_data = flight["airline"]
+                    airline_iata = airline_data.get("code", {}).get("iata")
+                    airline_icao_code = airline_data.get("code", {}).get("icao")
+                    logo_code = airline_iata or airline_icao_code
+                    if logo_code:
+                        data["airline_logo"] = f"https://pics.avs.io/200/200/{logo_code}.png"
+
+        except Exception as e:
+            # Upstream is down: keep the last good answer rather than caching a worse one.
+            if upstream_down(e):
+                raise
+
+    if not image_url:
+        # Anything learned for this airframe or this airline + type family skips the fan-out below.
+        image_url = _images.lookup(registration, airline_icao, aircraft_code, include_airline=False)
+
+    if not image_url and airline_icao:
+        try:
             
+            flights = _upstream.request(fr_api.get_flights, airline=airline_icao)
+            flights = flights[:15] 
             
-            ac_code_simple = ""
-            if aircraft_code:
-                import re
-                match = re.search(r'([A-Z0-9]{3})', aircraft_code)
-                if match:
-                    ac_code_simple = match.group(1)
+            target_code = aircraft_code.upper() if aircraft_family(aircraft_code) else None
+
+            # Most promising airframes first, so they get the first upstream slots.
+            flights = sorted(flights, key=lambda f: match_rank(target_code, f.aircraft_code or ""))
+
+            # Candidate photos are saved in one write once the search is over; calls that
+            # outlive it still feed the image cache, one write each.
+            found = []
+            search_over = []
+            found_lock = threading.Lock()
+
+            def check_candidate(f):
+                try:
+                   
+                    details = fr_api.get_flight_details(f)
+                    if 'aircraft' in details and 'images' in details['aircraft']:
+                        images = details['aircraft']['images']
+                        img_src = None
+                        if 'medium' in images and len(images['medium']) > 0:
+                            img_src = images['medium'][0]['src']
+                        elif 'large' in images and len(images['large']) > 0:
+                            img_src = images['large'][0]['src']
+                        
+                        if img_src:
+                            item = (img_src, details['aircraft'].get('registration'), airline_icao, f.aircraft_code)
+                            with found_lock:
+                                late = bool(search_over)
+                                if not late:
+                                    found.append(item)
+                            if late:
+                                _images.learn(*item)
+                            return (f, img_src)
+                except:
+                    pass
+                return None
+
+            search_budget = IMAGE_SEARCH_BUDGET if budget is None else float(budget)
+            with _metrics.stage("image_search"):
+                try:
+                    candidate_image, first_image = _upstream.run(
+                        search_images(flights, target_code, check_candidate, search_budget))
+                finally:
+                    with found_lock:
+                        search_over.append(True)
+                    _images.learn_many(found)
             
-            key = f"{airline_icao}_{ac_code_simple}"
+            image_url = candidate_image
+            if image_url:
+                # Remember what this airline + type resolved to so the next open is a cache hit.
+                _images.learn(image_url, None, airline_icao, aircraft_code)
+                            
+        except Exception as e:
             
-           
-            if key in STATIC_IMAGES:
-                image_url = STATIC_IMAGES[key]
-            else:
-                
-                for k, url in STATIC_IMAGES.items():
-                    parts = k.split('_')
-                    if len(parts) == 2:
-                        if parts[0] == airline_icao and parts[1] in (aircraft_code or ""):
-                            image_url = url
-                            break
-
-        if image_url:
-            data["image_url"] = image_url
-        
-        return {"success": True, "data": data}
+            pass
+
+    if not image_url:
+        # Any photo of the airline comes last: it may well be another type.
+        image_url = local_image(airline_icao, aircraft_code) or first_image
+
+    if image_url:
+        data["image_url"] = image_url
+    
+    return data
+
+
+def get_flight_details_data(flight_id, airline_icao=None, aircraft_code=None, budget=None):
+    if flight_api_error:
+        return {"success": False, "error": f"Import Error: {flight_api_error}"}
+
+    try:
+        key = (flight_id, (airline_icao or "").upper(), (aircraft_code or "").upper())
+        try:
+            data, updated_at = _details.get(
+                key, lambda: load_flight_details(flight_id, airline_icao, aircraft_code, budget))
+        except Exception as e:
+            if not upstream_down(e):
+                raise
+            # Upstream down and nothing cached for this flight: answer from local data only.
+            image_url = local_image(airline_icao, aircraft_code)
+            return {"success": True, "data": {"image_url": image_url} if image_url else {}, "degraded": True}
+
+        age = time.time() - updated_at
+        return {"success": True, "data": data, "updated_at": updated_at, "age": round(age, 1),
+                "stale": age >= DETAILS_TTL}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -186,6 +262,7 @@ def get_flight_details_data(flight_id, airline_icao=None, aircraft_code=None):
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("flight_details")
         query = urlparse(self.path).query
         params = parse_qs(query)
         flight_id = params.get('id', [''])[0]
@@ -197,10 +274,15 @@ class handler(BaseHTTPRequestHandler):
         else:
              result = get_flight_details_data(flight_id, airline_icao, aircraft_code)
         
+        with _metrics.stage("serialize"):
+            body = json.dumps(result).encode('utf-8')
+        
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        _metrics.send_server_timing(self)
         self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        self.wfile.write(body)
+        _metrics.finish(len(body), result.get("success"))
 
 
 if __name__ == "__main__":
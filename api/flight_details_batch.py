@@ -0,0 +1,139 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import sys
+import os
+import json
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from flight_details import get_flight_details_data
+
+MAX_BATCH = 50
+BATCH_CONCURRENCY = int(os.environ.get("PASSAIR_BATCH_CONCURRENCY", "8"))
+
+# Shared by every batch in the process, so concurrent batches queue behind one limit.
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="details")
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def parse_batch(items):
+    # Raises ValueError for anything that is not a flight ID or an object with one.
+    batch = []
+    seen = set()
+    for item in items:
+        if isinstance(item, (str, int)):
+            item = {"id": item}
+        if not isinstance(item, dict) or isinstance(item.get("id"), (dict, list)):
+            raise ValueError("Each flight must be an ID or an object with an \"id\"")
+        flight_id = _text(item.get("id"))
+        if not flight_id or flight_id in seen:
+            continue
+        seen.add(flight_id)
+        batch.append({
+            "id": flight_id,
+            "airline_icao": _text(item.get("airline_icao")) or None,
+            "aircraft": _text(item.get("aircraft")) or None
+        })
+    return batch[:MAX_BATCH]
+
+
+def parse_query(params):
+    # ?ids=a,b,c&airline_icao=X,,Z&aircraft=A320,B738, -- the optional lists line up with ids.
+    ids = params.get('ids', [''])[0].split(',')
+    airlines = params.get('airline_icao', [''])[0].split(',')
+    aircraft = params.get('aircraft', [''])[0].split(',')
+
+    return [{
+        "id": flight_id,
+        "airline_icao": airlines[i] if i < len(airlines) else None,
+        "aircraft": aircraft[i] if i < len(aircraft) else None
+    } for i, flight_id in enumerate(ids)]
+
+
+def iter_flight_details(batch):
+    futures = {
+        _executor.submit(get_flight_details_data, item["id"], item["airline_icao"], item["aircraft"]): item["id"]
+        for item in batch
+    }
+    for future in concurrent.futures.as_completed(futures):
+        yield {"id": futures[future], **future.result()}
+
+
+class handler(BaseHTTPRequestHandler):
+    # Results are written as they complete (NDJSON), so there is no length up front.
+    streaming = True
+
+    def _respond(self, batch):
+        # Server-Timing only covers what happened before the first line; the request
+        # metrics are recorded once the last one is written.
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        _metrics.send_server_timing(self)
+        self.end_headers()
+
+        if not batch:
+            body = (json.dumps({"success": False, "error": "Missing flight IDs"}) + "\n").encode('utf-8')
+            self.wfile.write(body)
+            _metrics.finish(len(body), False)
+            return
+
+        size = 0
+        ok = True
+        try:
+            with _metrics.stage("details"):
+                for result in iter_flight_details(batch):
+                    line = (json.dumps(result) + "\n").encode('utf-8')
+                    self.wfile.write(line)
+                    self.wfile.flush()
+                    size += len(line)
+                    ok = ok and result.get("success")
+        except (BrokenPipeError, ConnectionResetError):
+            ok = False
+        finally:
+            _metrics.finish(size, ok)
+
+    def _send_error(self, code, message):
+        body = json.dumps({"success": False, "error": message}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        _metrics.send_server_timing(self)
+        self.end_headers()
+        self.wfile.write(body)
+        _metrics.finish(len(body), False)
+
+    def do_GET(self):
+        _metrics.begin("flight_details_batch")
+        params = parse_qs(urlparse(self.path).query)
+        with _metrics.stage("parse"):
+            batch = parse_batch(parse_query(params))
+        self._respond(batch)
+
+    def do_POST(self):
+        _metrics.begin("flight_details_batch")
+        try:
+            with _metrics.stage("parse"):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b"[]")
+                items = body.get("flights", []) if isinstance(body, dict) else body
+                if not isinstance(items, list):
+                    raise ValueError("\"flights\" must be a list")
+                batch = parse_batch(items)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError too.
+            self._send_error(400, f"Invalid batch: {e}")
+            return
+
+        self._respond(batch)
+
+
+if __name__ == "__main__":
+    batch = parse_batch(sys.argv[1:])
+    if not batch:
+        print(json.dumps({"success": False, "error": "No flight IDs provided"}))
+    for result in iter_flight_details(batch):
+        print(json.dumps(result), flush=True)
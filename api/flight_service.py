@@ -1,60 +1,60 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sys
+import os
 import json
+import time
 
-flight_api_error = None
-try:
-    from FlightRadar24 import FlightRadar24API
-except ImportError as e1:
-    try:
-        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
-    except ImportError as e2:
-        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _client import get_api, flight_api_error
+import _metrics
+from _tiles import fetch_world
+from _snapshot import get_snapshot, wait_for_refresh, get_snapshot_version, freshness
+from _spatial import query_view
+from _motion import extrapolate
+from _delta import diff_flights, DEFAULT_PRECISION
+from _wire import negotiate, encode_result
 
 
-def get_flights_in_bounds(min_lat=None, max_lat=None, min_lon=None, max_lon=None, limit=1500):
+def get_flights_in_bounds(min_lat=None, max_lat=None, min_lon=None, max_lon=None, limit=1500, sort_by="altitude",
+                          since=None, precision=DEFAULT_PRECISION, at=None, since_at=None):
     if flight_api_error:
         return {"success": False, "error": f"Import Error: {flight_api_error}"}
 
     try:
-        fr_api = FlightRadar24API()
-        
-        if min_lat and max_lat and min_lon and max_lon:
-            bounds = f"{max_lat},{min_lat},{min_lon},{max_lon}"
-            flights = fr_api.get_flights(bounds=bounds)
-        else:
-            flights = fr_api.get_flights()
+        snapshot = get_snapshot(lambda: fetch_world(get_api()))
+        limit = int(limit)
+        flight_data = query_view(snapshot, min_lat, max_lat, min_lon, max_lon, limit, sort_by)
+        version = snapshot.get("version")
 
-        if not flights:
-             return {"success": True, "data": [], "message": "No flights found from FlightRadarAPI"}
+        # ?at=<unix time> (or "now"): project positions forward from the snapshot instead
+        # of asking upstream again, so clients can animate between refreshes.
+        if at:
+            at = time.time() if at == "now" else float(at)
+            flight_data = extrapolate(flight_data, at - snapshot["fetched_at"])
+        extra = {"at": at} if at else {}
+        extra.update(freshness(snapshot))
 
-        flight_data = []
-        count = 0
-        limit = int(limit)
+        # Delta mode: rebuild the client's previous view from the snapshot it saw and
+        # send only what moved. Unknown versions fall through to a full response.
+        # ?since_at is the `at` that view was rendered for; without it the client holds
+        # the snapshot's own positions. Either way the delta carries it to this view.
+        base = get_snapshot_version(since) if since else None
+        if base is not None:
+            base_data = query_view(base, min_lat, max_lat, min_lon, max_lon, limit, sort_by)
+            if since_at:
+                base_data = extrapolate(base_data, float(since_at) - base["fetched_at"])
+            with _metrics.stage("delta"):
+                delta = diff_flights(base_data, flight_data, int(precision))
+            return {"success": True, "mode": "delta", "version": version, "since": base.get("version"),
+                    "count": len(flight_data), **extra, **delta}
+
+        if not flight_data:
+             return {"success": True, "mode": "full", "version": version, "data": [], "message": "No flights found from FlightRadarAPI",
+                     **extra}
 
-        for f in flights:
-            if count >= limit: break
-            
-            flight_data.append({
-                "id": f.id,
-                "callsign": f.callsign or "N/A",
-                "latitude": f.latitude,
-                "longitude": f.longitude,
-                "heading": f.heading,
-                "altitude": f.altitude,
-                "ground_speed": f.ground_speed,
-                "speed": f.ground_speed,
-                "airline": f.airline_iata or "Unknown",
-                "airline_icao": f.airline_icao or "",
-                "aircraft": f.aircraft_code or "N/A",
-                "origin": f.origin_airport_iata or "N/A",
-                "destination": f.destination_airport_iata or "N/A",
-                "flight_number": f.number or "N/A"
-            })
-            count += 1
-            
-        return {"success": True, "data": flight_data, "count": len(flight_data)}
+        return {"success": True, "mode": "full", "version": version, "data": flight_data, "count": len(flight_data),
+                **extra}
 
     except Exception as e:
         return {"success": False, "error": f"Service Error: {str(e)}", "type": type(e).__name__}
@@ -62,6 +62,7 @@ def get_flights_in_bounds(min_lat=None, max_lat=None, min_lon=None, max_lon=None
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("flight_service")
         query = urlparse(self.path).query
         params = parse_qs(query)
         
@@ -70,13 +71,26 @@ class handler(BaseHTTPRequestHandler):
         min_lon = params.get('min_lon', [None])[0]
         max_lon = params.get('max_lon', [None])[0]
         limit = params.get('limit', [1500])[0]
+        sort_by = params.get('sort', ['altitude'])[0]
+        since = params.get('since', [None])[0]
+        precision = params.get('precision', [DEFAULT_PRECISION])[0]
+        at = params.get('at', [None])[0]
+        since_at = params.get('since_at', [None])[0]
+        
+        fmt = negotiate(params.get('format', [None])[0], self.headers.get('Accept'))
         
-        result = get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit)
+        result = get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit, sort_by, since, precision, at,
+                                       since_at)
+        with _metrics.stage("serialize"):
+            body, content_type = encode_result(result, fmt)
         
         self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Vary', 'Accept')
+        _metrics.send_server_timing(self)
         self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        self.wfile.write(body)
+        _metrics.finish(len(body), result.get("success"))
 
 
 if __name__ == "__main__":
@@ -85,5 +99,11 @@ if __name__ == "__main__":
     min_lon = sys.argv[3] if len(sys.argv) > 3 else None
     max_lon = sys.argv[4] if len(sys.argv) > 4 else None
     limit = sys.argv[5] if len(sys.argv) > 5 else 1500
+    sort_by = sys.argv[6] if len(sys.argv) > 6 else "altitude"
+    since = sys.argv[7] if len(sys.argv) > 7 else None
+    at = sys.argv[8] if len(sys.argv) > 8 else None
+    since_at = sys.argv[9] if len(sys.argv) > 9 else None
     
-    print(json.dumps(get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit)))
+    print(json.dumps(get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit, sort_by, since, at=at,
+                                           since_at=since_at)))
+    wait_for_refresh()
@@ -0,0 +1,271 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import sys
+import os
+import json
+import time
+import select
+import socket
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _client import get_api, flight_api_error
+from _tiles import fetch_world
+from _snapshot import get_snapshot, get_snapshot_version, SNAPSHOT_TTL, wait_for_refresh
+from _spatial import query_view
+from _delta import diff_flights, DEFAULT_PRECISION
+
+# Server-Sent Events: a client subscribes to a bounding box and gets the full view once,
+# then one delta per new snapshot. A single refresh loop per process watches for new
+# snapshots; subscribers watching the same view from the same version share one
+# encoded event. Streams end after STREAM_MAX_AGE and EventSource reconnects with
+# Last-Event-ID, which resumes with a delta.
+#
+# Only scripts/serve_api.py sends a body while it is being written. Where responses are
+# buffered (Vercel's Python functions) a stream cannot work, so the handler answers with
+# a single event and EventSource's retry turns it into polling with deltas.
+
+STREAM_MAX_AGE = float(os.environ.get("PASSAIR_STREAM_MAX_AGE", "300"))
+# Open streams per process. Each holds a server thread for its whole life, so serve_api.py
+# adds this many threads to its pool; clients past it get a 503.
+STREAM_MAX_CLIENTS = int(os.environ.get("PASSAIR_STREAM_CLIENTS", "8"))
+HEARTBEAT = 15
+# How often a quiet stream checks whether its client is still there.
+CLIENT_CHECK = 5
+RETRY_MS = 2000
+
+
+class FlightHub:
+    def __init__(self, interval):
+        self.interval = interval
+        self.snapshot = None
+        self.subscribers = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self._events = {}
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="flight-hub", daemon=True)
+                self.thread.start()
+
+    def refresh(self):
+        try:
+            snapshot = get_snapshot(lambda: fetch_world(get_api()))
+        except Exception:
+            return
+        with self.condition:
+            if self.snapshot is None or snapshot["version"] != self.snapshot["version"]:
+                self.snapshot = snapshot
+                self._events = {}
+                self.condition.notify_all()
+
+    def run(self):
+        while True:
+            if self.subscribers:
+                self.refresh()
+            time.sleep(self.interval)
+
+    def subscribe(self):
+        self.start()
+        with self.condition:
+            self.subscribers += 1
+            snapshot = self.snapshot
+        if snapshot is None or time.time() - snapshot["fetched_at"] >= SNAPSHOT_TTL:
+            # Nobody was watching, so the hub's snapshot may be missing or old.
+            self.refresh()
+        return self.snapshot
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+
+    def wait(self, version, timeout):
+        # Next snapshot after `version`, or None if none arrived within timeout.
+        with self.condition:
+            self.condition.wait_for(lambda: self.snapshot is not None and self.snapshot["version"] != version,
+                                    timeout=timeout)
+            if self.snapshot is None or self.snapshot["version"] == version:
+                return None
+            return self.snapshot
+
+    def event(self, snapshot, view, since=None):
+        # Encoded event for `view` at `snapshot`: a delta from `since` when that
+        # version is still around, the full view otherwise. Memoized per snapshot.
+        key = (snapshot["version"], view, since)
+        with self.condition:
+            cached = self._events.get(key)
+        if cached is not None:
+            return cached
+
+        min_lat, max_lat, min_lon, max_lon, limit, sort_by, precision = view
+        rows = query_view(snapshot, min_lat, max_lat, min_lon, max_lon, limit, sort_by)
+        base = get_snapshot_version(since) if since else None
+
+        if base is not None:
+            base_rows = query_view(base, min_lat, max_lat, min_lon, max_lon, limit, sort_by)
+            with _metrics.stage("delta"):
+                delta = diff_flights(base_rows, rows, precision)
+            payload = {"mode": "delta", "version": snapshot["version"], "since": base["version"], "count": len(rows),
+                       "updated_at": snapshot["fetched_at"], **delta}
+        else:
+            payload = {"mode": "full", "version": snapshot["version"], "data": rows, "count": len(rows),
+                       "updated_at": snapshot["fetched_at"]}
+
+        with _metrics.stage("serialize"):
+            encoded = format_event(payload["mode"], payload, snapshot["version"])
+        with self.condition:
+            if self.snapshot is snapshot:
+                self._events[key] = encoded
+        return encoded
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+hub = FlightHub(max(SNAPSHOT_TTL / 2, 1.0))
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CLIENTS)
+
+
+def parse_view(params):
+    min_lat = params.get('min_lat', [None])[0]
+    max_lat = params.get('max_lat', [None])[0]
+    min_lon = params.get('min_lon', [None])[0]
+    max_lon = params.get('max_lon', [None])[0]
+    limit = int(params.get('limit', [1500])[0])
+    sort_by = params.get('sort', ['altitude'])[0]
+    precision = int(params.get('precision', [DEFAULT_PRECISION])[0])
+    return (min_lat, max_lat, min_lon, max_lon, limit, sort_by, precision)
+
+
+def stream_flights(write, view, since=None, max_age=STREAM_MAX_AGE, closed=None):
+    # The retry line goes out with the initial event, so the first write holds the whole
+    # first answer (the handler times up to it).
+    retry = f"retry: {RETRY_MS}\n\n".encode('utf-8')
+    if flight_api_error:
+        write(retry + format_event("error", {"success": False, "error": f"Import Error: {flight_api_error}"}))
+        return
+
+    snapshot = hub.subscribe()
+    try:
+        if snapshot is None:
+            write(retry + format_event("error", {"success": False, "error": "Timed out waiting for the flight snapshot"}))
+            return
+
+        deadline = time.time() + max_age
+        write(retry + hub.event(snapshot, view, since))
+        version = snapshot["version"]
+        written_at = time.time()
+
+        while time.time() < deadline:
+            snapshot = hub.wait(version, min(CLIENT_CHECK, max(deadline - time.time(), 0)))
+            if closed is not None and closed():
+                return
+            if snapshot is not None:
+                write(hub.event(snapshot, view, version))
+                version = snapshot["version"]
+                written_at = time.time()
+            elif time.time() - written_at >= HEARTBEAT:
+                # Comment line: keeps proxies from timing the stream out.
+                write(b": keep-alive\n\n")
+                written_at = time.time()
+    finally:
+        hub.unsubscribe()
+
+
+def start_background():
+    hub.start()
+
+
+class handler(BaseHTTPRequestHandler):
+    streaming = True
+    max_clients = STREAM_MAX_CLIENTS
+
+    def _send_error(self, code, message, headers=()):
+        body = json.dumps({"success": False, "error": message}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        for name, value in headers:
+            self.send_header(name, value)
+        _metrics.send_server_timing(self)
+        self.end_headers()
+        self.wfile.write(body)
+        _metrics.finish(len(body), False)
+
+    def do_GET(self):
+        _metrics.begin("flight_stream")
+        params = parse_qs(urlparse(self.path).query)
+        since = self.headers.get('Last-Event-ID') or params.get('since', [None])[0]
+
+        try:
+            view = parse_view(params)
+        except ValueError:
+            self._send_error(400, "Invalid limit or precision")
+            return
+
+        # serve_api.py marks the requests it streams; anything else gets one event.
+        live = getattr(self, "_streaming", False)
+        if live and not _stream_slots.acquire(blocking=False):
+            self._send_error(503, "Too many open flight streams", [('Retry-After', str(HEARTBEAT))])
+            return
+
+        try:
+            self._stream(view, since, STREAM_MAX_AGE if live else 0)
+        finally:
+            if live:
+                _stream_slots.release()
+
+    def _stream(self, view, since, max_age):
+        started = []
+
+        def write(chunk):
+            if not started:
+                # Headers wait for the initial event so Server-Timing can cover it; the
+                # request is measured up to there, not over the life of the stream.
+                started.append(True)
+                self.send_response(200)
+                self.send_header('Content-type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('X-Accel-Buffering', 'no')
+                _metrics.send_server_timing(self)
+                self.end_headers()
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                _metrics.finish(len(chunk), b"event: error" not in chunk)
+                return
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+        def closed():
+            # A client that went away leaves the socket readable at EOF (it never sends a body).
+            try:
+                readable, _, _ = select.select([self.connection], [], [], 0)
+                return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+            except (OSError, ValueError):
+                return True
+
+        try:
+            stream_flights(write, view, since, max_age, closed if max_age else None)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            # No-op once the initial event went out.
+            _metrics.finish(0, False)
+
+
+if __name__ == "__main__":
+    max_age = float(sys.argv[1]) if len(sys.argv) > 1 else STREAM_MAX_AGE
+
+    def write(chunk):
+        sys.stdout.write(chunk.decode('utf-8'))
+        sys.stdout.flush()
+
+    stream_flights(write, (None, None, None, None, 1500, "altitude", DEFAULT_PRECISION), max_age=max_age)
+    wait_for_refresh()
@@ -1,101 +1,37 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sys
+import os
 import json
-import random
 
-flight_api_error = None
-try:
-    from FlightRadar24 import FlightRadar24API
-except ImportError as e1:
-    try:
-        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
-    except ImportError as e2:
-        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _client import get_api, flight_api_error
+from _tiles import fetch_world
+from _snapshot import get_snapshot, wait_for_refresh, freshness
+from _spatial import query_view
 
-def get_mock_flights():
-    
-    return [
-        {
-            "id": "mock1", "callsign": "LA3418", "latitude": -23.43, "longitude": -46.47, "heading": 45,
-            "altitude": 35000, "ground_speed": 450, "speed": 450, "airline": "LA", "airline_icao": "TAM", "aircraft": "A320",
-            "origin": "GRU", "destination": "POA", "flight_number": "LA3418"
-        },
-        {
-            "id": "mock2", "callsign": "TP89", "latitude": 38.77, "longitude": -9.13, "heading": 200,
-            "altitude": 38000, "ground_speed": 480, "speed": 480, "airline": "TP", "airline_icao": "TAP", "aircraft": "A330",
-            "origin": "LIS", "destination": "GRU", "flight_number": "TP89"
-        },
-        {
-            "id": "mock3", "callsign": "AA950", "latitude": 40.64, "longitude": -73.77, "heading": 180,
-            "altitude": 12000, "ground_speed": 300, "speed": 300, "airline": "AA", "airline_icao": "AAL", "aircraft": "B777",
-            "origin": "JFK", "destination": "GRU", "flight_number": "AA950"
-        },
-        {
-            "id": "mock4", "callsign": "G31234", "latitude": -22.81, "longitude": -43.24, "heading": 270,
-            "altitude": 28000, "ground_speed": 420, "speed": 420, "airline": "G3", "airline_icao": "GLO", "aircraft": "B738",
-            "origin": "GIG", "destination": "CGH", "flight_number": "G31234"
-        }
-    ]
 
-def get_flights_in_bounds(min_lat=None, max_lat=None, min_lon=None, max_lon=None, limit=1500):
+def get_flights_in_bounds(min_lat=None, max_lat=None, min_lon=None, max_lon=None, limit=1500, sort_by="altitude"):
     
     if flight_api_error:
-        return {"success": True, "data": get_mock_flights(), "message": f"API Error, using mock. {flight_api_error}"}
+        return {"success": False, "degraded": True, "error": f"Import Error: {flight_api_error}"}
 
     try:
-        fr_api = FlightRadar24API()
-        
-        flights = []
-        try:
-            if min_lat and max_lat and min_lon and max_lon:
-                bounds = f"{max_lat},{min_lat},{min_lon},{max_lon}"
-                flights = fr_api.get_flights(bounds=bounds)
-            else:
-                flights = fr_api.get_flights()
-        except Exception as api_err:
-            print(f"API Call Error: {api_err}")
-           
+        # An old snapshot comes back flagged "stale" with its age; only with no snapshot
+        # at all (first start while upstream is down) is there nothing to show.
+        snapshot = get_snapshot(lambda: fetch_world(get_api()))
+        flights = query_view(snapshot, min_lat, max_lat, min_lon, max_lon, int(limit), sort_by)
 
-       
-        if not flights:
-             
-             return {"success": True, "data": get_mock_flights(), "message": "No flights from API, using mock data"}
-
-        flight_data = []
-        count = 0
-        limit = int(limit)
-
-        for f in flights:
-            if count >= limit: break
-            
-            flight_data.append({
-                "id": f.id,
-                "callsign": f.callsign or "N/A",
-                "latitude": f.latitude,
-                "longitude": f.longitude,
-                "heading": f.heading,
-                "altitude": f.altitude,
-                "ground_speed": f.ground_speed,
-                "speed": f.ground_speed,
-                "airline": f.airline_iata or "Unknown",
-                "airline_icao": f.airline_icao or "",
-                "aircraft": f.aircraft_code or "N/A",
-                "origin": f.origin_airport_iata or "N/A",
-                "destination": f.destination_airport_iata or "N/A",
-                "flight_number": f.number or "N/A"
-            })
-            count += 1
-            
-        return {"success": True, "data": flight_data, "count": len(flight_data)}
+        return {"success": True, "data": flights, "count": len(flights), **freshness(snapshot)}
 
     except Exception as e:
-       
-        return {"success": True, "data": get_mock_flights(), "message": f"Exception: {str(e)}, using mock data"}
+        return {"success": False, "degraded": True, "error": f"Flight data unavailable: {str(e)}"}
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("flights")
         query = urlparse(self.path).query
         params = parse_qs(query)
         
@@ -104,13 +40,19 @@ class handler(BaseHTTPRequestHandler):
         min_lon = params.get('min_lon', [None])[0]
         max_lon = params.get('max_lon', [None])[0]
         limit = params.get('limit', [1500])[0]
+        sort_by = params.get('sort', ['altitude'])[0]
+        
+        result = get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit, sort_by)
         
-        result = get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit)
+        with _metrics.stage("serialize"):
+            body = json.dumps(result).encode('utf-8')
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        _metrics.send_server_timing(self)
         self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        self.wfile.write(body)
+        _metrics.finish(len(body), result.get("success"))
 
 
 if __name__ == "__main__":
@@ -119,5 +61,7 @@ if __name__ == "__main__":
     min_lon = sys.argv[3] if len(sys.argv) > 3 else None
     max_lon = sys.argv[4] if len(sys.argv) > 4 else None
     limit = sys.argv[5] if len(sys.argv) > 5 else 1500
+    sort_by = sys.argv[6] if len(sys.argv) > 6 else "altitude"
     
-    print(json.dumps(get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit)))
+    print(json.dumps(get_flights_in_bounds(min_lat, max_lat, min_lon, max_lon, limit, sort_by)))
+    wait_for_refresh()
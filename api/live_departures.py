@@ -1,189 +1,327 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-flight_api_error = None
-try:
-    from FlightRadar24 import FlightRadar24API
-except ImportError as e1:
-    try:
-        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
-    except ImportError as e2:
-        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
 import sys
+import os
 import json
 import uuid
+import time
 import datetime
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _client import get_api, flight_api_error
+import _upstream
+from _cache import SWRCache, TTLCache
+from _reference import parse_flight_number
+from _schedule import extract_departures, seed_departure_page, get_departure_page, SCHEDULE_PAGES, SCHEDULE_TTL
+
+BOARD_TTL = float(os.environ.get("PASSAIR_BOARD_TTL", "60"))
+HOT_AIRPORTS = [a.strip().upper() for a in os.environ.get("PASSAIR_HOT_AIRPORTS", "GRU").split(",") if a.strip()]
+
+DEFAULT_PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+
+_boards = SWRCache(BOARD_TTL, max_entries=500, name="departure_boards")
+_page_boards = TTLCache(SCHEDULE_TTL, max_entries=600)
+_prewarm = {"thread": None}
+
+
+def departure_row(flight, airport_iata):
+    identification = flight.get('identification', {})
+    airline = flight.get('airline') or {}
+    aircraft = flight.get('aircraft') or {}
+    status = flight.get('status', {}).get('text') or "Scheduled"
+
+    times = flight.get('time', {})
+    scheduled_dep = times.get('scheduled', {}).get('departure')
+    scheduled_arr = times.get('scheduled', {}).get('arrival')
+
+    duration_str = "N/A"
+    if scheduled_dep and scheduled_arr:
+        try:
+            dep_dt = datetime.datetime.fromtimestamp(scheduled_dep)
+            arr_dt = datetime.datetime.fromtimestamp(scheduled_arr)
+            diff = arr_dt - dep_dt
+            hours, remainder = divmod(diff.seconds, 3600)
+            minutes = remainder // 60
+            duration_str = f"{hours}h {minutes}m"
+        except:
+            pass
+
+    dep_time_str = "TBD"
+    if scheduled_dep:
+        dep_time_str = datetime.datetime.fromtimestamp(scheduled_dep).strftime('%H:%M')
+
+    arr_time_str = "TBD"
+    if scheduled_arr:
+        arr_time_str = datetime.datetime.fromtimestamp(scheduled_arr).strftime('%H:%M')
+
+    airline_iata = airline.get('code', {}).get('iata')
+    airline_icao = airline.get('code', {}).get('icao')
+
+    flight_number = identification.get('number', {}).get('default') or "N/A"
+
+
+    callsign = identification.get('callsign')
+    if not callsign or callsign == "N/A":
+        callsign = flight_number
+
+    airline_prefix, parsed_icao = parse_flight_number(flight_number)
+    if not airline_icao:
+        airline_icao = parsed_icao
+
+    logo_code = airline_iata or airline_icao or airline_prefix
+
+    logo_url = f"https://pics.avs.io/200/200/{logo_code}.png" if logo_code else None
+
+    return {
+        "id": identification.get('id') or str(uuid.uuid4()),
+        "callsign": callsign,
+        "flight_number": flight_number,
+        "origin": airport_iata,
+        "destination": flight.get('airport', {}).get('destination', {}).get('code', {}).get('iata') or "N/A",
+        "airline": airline.get('name') or "Unknown",
+        "airline_icao": airline_icao,
+        "airline_logo": logo_url,
+        "aircraft": aircraft.get('model', {}).get('text') or "N/A",
+        "status": status,
+        "duration": duration_str,
+        "departureTime": dep_time_str,
+        "arrivalTime": arr_time_str
+    }
+
+
+class DepartureBoard:
+    # One schedule page kept as the raw upstream items; rows are normalized only when
+    # a page of results actually reaches them, and then memoized.
+    __slots__ = ("airport_iata", "items", "normalized", "rows", "order")
+
+    def __init__(self, airport_iata, items, normalized=False):
+        self.airport_iata = airport_iata
+        self.items = items
+        self.normalized = normalized
+        self.rows = {}
+        self.order = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def scheduled(self, i):
+        if self.normalized:
+            return None
+        return ((self.items[i]['flight'].get('time') or {}).get('scheduled') or {}).get('departure')
+
+    def has_row(self, i):
+        return self.normalized or bool(self.items[i].get('flight'))
+
+    def row(self, i):
+        if self.normalized:
+            return self.items[i]
+        row = self.rows.get(i)
+        if row is None:
+            row = self.rows[i] = departure_row(self.items[i]['flight'], self.airport_iata)
+        return row
+
+    def flight_id(self, i):
+        if self.normalized:
+            return self.items[i]["id"]
+        return (self.items[i]['flight'].get('identification') or {}).get('id') or self.row(i)["id"]
+
+    def ordered(self):
+        # (scheduled departure, flight id, position) of every row, in the order they are
+        # served. A row without a time keeps the one before it, so it stays where upstream
+        # listed it.
+        if self.order is None:
+            order = []
+            scheduled = 0
+            for i in range(len(self.items)):
+                if self.has_row(i):
+                    scheduled = int(self.scheduled(i) or scheduled)
+                    order.append((scheduled, self.flight_id(i), i))
+            order.sort()
+            self.order = order
+        return self.order
 
 
-def get_live_departures_data(airport_iata="GRU"):
+def load_departure_board(airport_iata):
+    fr_api = get_api()
+    
+    try:
+        data = extract_departures(_upstream.request(fr_api.get_airport_details, airport_iata))
+        # The board is page 1 of the schedule; let route searches reuse it.
+        seed_departure_page(airport_iata, 1, data)
+        
+        if any(item.get('flight') for item in data):
+            return DepartureBoard(airport_iata, data)
+    except Exception as e:
+        # The last real schedule (served stale by _boards) beats the live-flights approximation.
+        last_good = _boards.peek(airport_iata)
+        if last_good is not None and not last_good[1].normalized:
+            raise
+
+    departures = []
+    bounds = fr_api.get_bounds_by_point(-23.432, -46.469, 40000)
+    flights = _upstream.request(fr_api.get_flights, bounds=bounds)
+    
+    for f in flights:
+        if f.origin_airport_iata == airport_iata:
+            departures.append({
+                "id": f.id or str(uuid.uuid4()),
+                "callsign": f.callsign or "N/A",
+                "flight_number": f.number or f.callsign or "N/A",
+                "origin": f.origin_airport_iata,
+                "destination": f.destination_airport_iata or "N/A",
+                "airline": f.airline_iata or f.airline_icao or "Unknown",
+                "airline_icao": f.airline_icao,
+                "airline_logo": f"https://pics.avs.io/200/200/{f.airline_iata}.png" if f.airline_iata else None,
+                "aircraft": f.aircraft_code or "N/A",
+                "status": "En Route" if f.on_ground == 0 else "On Ground",
+                "duration": "N/A",
+                "departureTime": "Now",
+                "arrivalTime": "TBD"
+            })
+
+    return DepartureBoard(airport_iata, departures, normalized=True)
+
+
+def get_schedule_board(airport_iata, page):
+    # Later schedule pages come from the page cache shared with search_flights.
+    items = get_departure_page(get_api(), airport_iata, page)
+    board = _page_boards.get((airport_iata, page))
+    if board is None or board.items is not items:
+        board = DepartureBoard(airport_iata, items)
+        _page_boards.set((airport_iata, page), board)
+    return board
+
+
+def parse_cursor(cursor):
+    # "<schedule page>:<scheduled departure>:<flight id>" of the last row served. The
+    # board shifts as flights depart, so the row is the anchor and the page only a hint.
+    try:
+        page, scheduled, flight_id = cursor.split(":", 2)
+        return max(int(page), 1), (int(scheduled), flight_id)
+    except (AttributeError, ValueError):
+        return 1, None
+
+
+def paginate(first_board, limit, cursor=None, since=None):
+    # The live-flights fallback is a single page; schedules run to SCHEDULE_PAGES.
+    last_page = 1 if first_board.normalized else SCHEDULE_PAGES
+    page, after = parse_cursor(cursor)
+
+    def board_at(page):
+        if page == 1:
+            return first_board
+        return get_schedule_board(first_board.airport_iata, page)
+
+    # Rows move to earlier pages as the front of the board departs: step back while the
+    # hinted page already starts past the anchor.
+    while after is not None and 1 < page <= last_page:
+        try:
+            order = board_at(page).ordered()
+        except Exception:
+            break
+        if order and order[0][:2] <= after:
+            break
+        page -= 1
+
+    rows = []
+    last = None
+    while len(rows) < limit and page <= last_page:
+        try:
+            board = board_at(page)
+        except Exception:
+            # Upstream trouble: the client resumes from the same anchor later.
+            return rows, "{}:{}:{}".format(*last) if last else cursor
+
+        for scheduled, flight_id, i in board.ordered():
+            if after is not None and (scheduled, flight_id) <= after:
+                continue
+            if len(rows) == limit:
+                return rows, "{}:{}:{}".format(*last)
+            last = (page, scheduled, flight_id)
+            if since:
+                departure = board.scheduled(i)
+                if departure and departure < since:
+                    continue
+            rows.append(board.row(i))
+
+        if not len(board):
+            # An empty page is the end of the schedule.
+            break
+        page += 1
+
+    more = last is not None and len(rows) == limit and page <= last_page
+    return rows, "{}:{}:{}".format(*last) if more else None
+
+
+def get_live_departures_data(airport_iata="GRU", limit=DEFAULT_PAGE_SIZE, cursor=None, since=None):
     if flight_api_error:
         return {"success": False, "error": f"Import Error: {flight_api_error}"}
 
     try:
-        fr_api = FlightRadar24API()
-        departures = []
+        airport_iata = airport_iata.upper()
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        since = int(float(since)) if since else None
         
-        try:
-            details = fr_api.get_airport_details(airport_iata)
-            
-            if 'airport' in details and 'pluginData' in details['airport']:
-                plugin_data = details['airport']['pluginData']
-                if 'schedule' in plugin_data and 'departures' in plugin_data['schedule']:
-                    data = plugin_data['schedule']['departures']['data']
-                    
-                    for item in data:
-                        flight = item.get('flight', {})
-                        if not flight: continue
-                        
-                        identification = flight.get('identification', {})
-                        airline = flight.get('airline') or {}
-                        aircraft = flight.get('aircraft') or {}
-                        status = flight.get('status', {}).get('text') or "Scheduled"
-                        
-                        times = flight.get('time', {})
-                        scheduled_dep = times.get('scheduled', {}).get('departure')
-                        scheduled_arr = times.get('scheduled', {}).get('arrival')
-                        
-                        duration_str = "N/A"
-                        if scheduled_dep and scheduled_arr:
-                            try:
-                                dep_dt = datetime.datetime.fromtimestamp(scheduled_dep)
-                                arr_dt = datetime.datetime.fromtimestamp(scheduled_arr)
-                                diff = arr_dt - dep_dt
-                                hours, remainder = divmod(diff.seconds, 3600)
-                                minutes = remainder // 60
-                                duration_str = f"{hours}h {minutes}m"
-                            except:
-                                pass
-
-                        dep_time_str = "TBD"
-                        if scheduled_dep:
-                            dep_time_str = datetime.datetime.fromtimestamp(scheduled_dep).strftime('%H:%M')
-                            
-                        arr_time_str = "TBD"
-                        if scheduled_arr:
-                            arr_time_str = datetime.datetime.fromtimestamp(scheduled_arr).strftime('%H:%M')
-
-                        airline_iata = airline.get('code', {}).get('iata')
-                        airline_icao = airline.get('code', {}).get('icao')
-                        
-                        flight_number = identification.get('number', {}).get('default') or "N/A"
-                        
-                        
-                        callsign = identification.get('callsign')
-                        if not callsign or callsign == "N/A":
-                            callsign = flight_number
-
-                        if not airline_icao and flight_number != "N/A":
-                            import re
-                            
-                            match = re.match(r'^([A-Z0-9]{2,3})\d+', flight_number)
-                            if match:
-                                code = match.group(1)
-                                if len(code) == 3:
-                                    airline_icao = code
-                                elif len(code) == 2:
-                                    
-                                    iata_map = {
-                                        'LA': 'LAN', 'JJ': 'TAM', # LATAM
-                                        'G3': 'GLO', # GOL
-                                        'AD': 'AZU', # Azul
-                                        'ET': 'ETH', # Ethiopian
-                                        'TP': 'TAP', # TAP Portugal
-                                        'AF': 'AFR', # Air France
-                                        'KL': 'KLM', # KLM
-                                        'IB': 'IBE', # Iberia
-                                        'UX': 'AEA', # Air Europa
-                                        'BA': 'BAW', # British Airways
-                                        'LH': 'DLH', # Lufthansa
-                                        'LX': 'SWR', # Swiss
-                                        'TK': 'THY', # Turkish
-                                        'QR': 'QTR', # Qatar
-                                        'EK': 'UAE', # Emirates
-                                        'AA': 'AAL', # American
-                                        'UA': 'UAL', # United
-                                        'DL': 'DAL', # Delta
-                                        'AC': 'ACA', # Air Canada
-                                        'AM': 'AMX', # Aeromexico
-                                        'CM': 'CMP', # Copa
-                                        'AV': 'AVA', # Avianca
-                                        'AR': 'ARG', # Aerolineas Argentinas
-                                        'H2': 'SKU', # Sky Airline
-                                        'JA': 'JAT', # JetSmart
-                                        'BO': 'BOL', # Boliviana
-                                        'PY': 'SUR', # Surinam
-                                    }
-                                    airline_icao = iata_map.get(code)
-                        
-                        logo_code = airline_iata or airline_icao
-                        
-                        if not logo_code and flight_number != "N/A":
-                             import re
-                             match = re.match(r'^([A-Z0-9]{2,3})\d+', flight_number)
-                             if match:
-                                 logo_code = match.group(1)
-
-                        logo_url = f"https://pics.avs.io/200/200/{logo_code}.png" if logo_code else None
-
-                        departures.append({
-                            "id": identification.get('id') or str(uuid.uuid4()),
-                            "callsign": callsign,
-                            "flight_number": flight_number,
-                            "origin": airport_iata,
-                            "destination": flight.get('airport', {}).get('destination', {}).get('code', {}).get('iata') or "N/A",
-                            "airline": airline.get('name') or "Unknown",
-                            "airline_icao": airline_icao,
-                            "airline_logo": logo_url,
-                            "aircraft": aircraft.get('model', {}).get('text') or "N/A",
-                            "status": status,
-                            "duration": duration_str,
-                            "departureTime": dep_time_str,
-                            "arrivalTime": arr_time_str
-                        })
-        except Exception as e:
-            pass
+        board, updated_at = _boards.get(airport_iata, lambda: load_departure_board(airport_iata))
+        with _metrics.stage("paginate"):
+            departures, next_cursor = paginate(board, limit, cursor, since)
+        age = time.time() - updated_at
 
-        if not departures:
-            bounds = fr_api.get_bounds_by_point(-23.432, -46.469, 40000)
-            flights = fr_api.get_flights(bounds=bounds)
-            
-            for f in flights:
-                if f.origin_airport_iata == airport_iata:
-                    departures.append({
-                        "id": f.id or str(uuid.uuid4()),
-                        "callsign": f.callsign or "N/A",
-                        "flight_number": f.number or f.callsign or "N/A",
-                        "origin": f.origin_airport_iata,
-                        "destination": f.destination_airport_iata or "N/A",
-                        "airline": f.airline_iata or f.airline_icao or "Unknown",
-                        "airline_icao": f.airline_icao,
-                        "airline_logo": f"https://pics.avs.io/200/200/{f.airline_iata}.png" if f.airline_iata else None,
-                        "aircraft": f.aircraft_code or "N/A",
-                        "status": "En Route" if f.on_ground == 0 else "On Ground",
-                        "duration": "N/A",
-                        "departureTime": "Now",
-                        "arrivalTime": "TBD"
-                    })
-
-        return {"success": True, "data": departures[:6]}
+        return {"success": True, "data": departures, "next_cursor": next_cursor, "updated_at": updated_at,
+                "age": round(age, 1), "stale": age >= BOARD_TTL}
         
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def start_background():
+    # Keeps the hot airports' boards warm; only worth it in a long-running process.
+    if not HOT_AIRPORTS or _prewarm["thread"] is not None:
+        return
+
+    def run():
+        while True:
+            for airport_iata in HOT_AIRPORTS:
+                entry = _boards.peek(airport_iata)
+                if entry is None or time.time() - entry[0] >= BOARD_TTL * 0.8:
+                    try:
+                        _boards.load(airport_iata, lambda: load_departure_board(airport_iata))
+                    except Exception:
+                        pass
+            time.sleep(BOARD_TTL / 4)
+
+    _prewarm["thread"] = threading.Thread(target=run, name="board-prewarm", daemon=True)
+    _prewarm["thread"].start()
+
+
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("live_departures")
         query = urlparse(self.path).query
         params = parse_qs(query)
         airport = params.get('airport', ['GRU'])[0]
+        limit = params.get('limit', [DEFAULT_PAGE_SIZE])[0]
+        cursor = params.get('cursor', [None])[0]
+        since = params.get('since', [None])[0]
+        
+        result = get_live_departures_data(airport, limit, cursor, since)
         
-        result = get_live_departures_data(airport)
+        with _metrics.stage("serialize"):
+            body = json.dumps(result).encode('utf-8')
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        _metrics.send_server_timing(self)
         self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        self.wfile.write(body)
+        _metrics.finish(len(body), result.get("success"))
 
 
 if __name__ == "__main__":
     airport = sys.argv[1] if len(sys.argv) > 1 else "GRU"
-    print(json.dumps(get_live_departures_data(airport)))
+    limit = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PAGE_SIZE
+    cursor = sys.argv[3] if len(sys.argv) > 3 else None
+    print(json.dumps(get_live_departures_data(airport, limit, cursor)))
@@ -0,0 +1,21 @@
+from http.server import BaseHTTPRequestHandler
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = _metrics.render().encode('utf-8')
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    sys.stdout.write(_metrics.render())
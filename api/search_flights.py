@@ -1,17 +1,57 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sys
+import os
 import json
-import concurrent.futures
+import datetime
 
-flight_api_error = None
-try:
-    from FlightRadar24 import FlightRadar24API
-except ImportError as e1:
-    try:
-        from FlightRadarAPI import FlightRadarAPI as FlightRadar24API
-    except ImportError as e2:
-        flight_api_error = f"Primary: {e1} | Fallback: {e2}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _metrics
+from _client import get_api, flight_api_error
+import _upstream
+from _schedule import fetch_departure_page, get_route_index, SCHEDULE_PAGES
+
+
+def departure_row(flight):
+    airline = flight.get('airline') or {}
+    aircraft = flight.get('aircraft') or {}
+    status = flight.get('status') or {}
+    times = flight.get('time') or {}
+    identification = flight.get('identification') or {}
+    
+    airline_iata = airline.get('code', {}).get('iata')
+    
+    logo_url = None
+    if airline_iata:
+        logo_url = f"https://pics.avs.io/200/200/{airline_iata}.png"
+
+    return {
+        "id": identification.get('id'),
+        "flight_number": identification.get('number', {}).get('default'),
+        "airline": {
+            "name": airline.get('name'),
+            "code": airline_iata,
+            "logo": logo_url
+        },
+        "aircraft": {
+            "model": aircraft.get('model', {}).get('text'),
+            "code": aircraft.get('model', {}).get('code')
+        },
+        "time": {
+            "scheduled": times.get('scheduled', {}).get('departure'),
+            "estimated": times.get('estimated', {}).get('departure'),
+            "real": times.get('real', {}).get('departure')
+        },
+        "status": status.get('text')
+    }
+
+
+def day_range(date_str):
+    # Same local-time day boundaries the date picker's value was compared with before.
+    day = datetime.datetime.strptime(date_str, '%Y-%m-%d')
+    start = day.timestamp()
+    end = (day + datetime.timedelta(days=1)).timestamp()
+    return start, end
 
 
 def search_flights_data(origin, dest, date_str=None):
@@ -19,98 +59,23 @@ def search_flights_data(origin, dest, date_str=None):
         return {"success": False, "error": f"Import Error: {flight_api_error}"}
 
     try:
-        fr_api = FlightRadar24API()
-        
-        flights_found = []
-        
-        def get_date_from_ts(ts):
-            if not ts: return None
-            import datetime
-            return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+        fr_api = get_api()
 
-        def fetch_page(page):
-            try:
-               
-                return fr_api.get_airport_details(origin, page=page)
-            except:
-                return None
+        # All pages at once on the shared upstream loop; a page that fails comes back as None.
+        with _metrics.stage("schedule"):
+            pages = _upstream.run(_upstream.gather(
+                [fetch_departure_page(fr_api, origin, page) for page in range(1, SCHEDULE_PAGES + 1)]))
 
+        index = get_route_index(origin, pages, departure_row)
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            results = list(executor.map(fetch_page, range(1, 7)))
-
-        for details in results:
-            if not details: continue
-            
-            if 'airport' in details and 'pluginData' in details['airport']:
-                plugin_data = details['airport']['pluginData']
-                if 'schedule' in plugin_data and 'departures' in plugin_data['schedule']:
-                    departures = plugin_data['schedule']['departures']['data']
-                    
-                    for item in departures:
-                        flight = item.get('flight', {})
-                        if not flight: continue
-                        
-                        flight_dest = flight.get('airport', {}).get('destination', {}).get('code', {}).get('iata')
-                        
-                        
-                        if flight_dest == dest:
-                            airline = flight.get('airline') or {}
-                            aircraft = flight.get('aircraft') or {}
-                            status = flight.get('status') or {}
-                            times = flight.get('time') or {}
-                            identification = flight.get('identification') or {}
-                            
-                            
-                            scheduled_ts = times.get('scheduled', {}).get('departure')
-                            if date_str and scheduled_ts:
-                                flight_date = get_date_from_ts(scheduled_ts)
-                                
-                                if flight_date != date_str:
-                                    
-                                    pass 
-                            
-                            airline_iata = airline.get('code', {}).get('iata')
-                            airline_icao = airline.get('code', {}).get('icao')
-                            
-                            
-                            logo_url = None
-                            if airline_iata:
-                                logo_url = f"https://pics.avs.io/200/200/{airline_iata}.png"
-                            elif airline_icao:
-                                
-                                pass
-
-                            flights_found.append({
-                                "id": identification.get('id'),
-                                "flight_number": identification.get('number', {}).get('default'),
-                                "airline": {
-                                    "name": airline.get('name'),
-                                    "code": airline_iata,
-                                    "logo": logo_url
-                                },
-                                "aircraft": {
-                                    "model": aircraft.get('model', {}).get('text'),
-                                    "code": aircraft.get('model', {}).get('code')
-                                },
-                                "time": {
-                                    "scheduled": scheduled_ts,
-                                    "estimated": times.get('estimated', {}).get('departure'),
-                                    "real": times.get('real', {}).get('departure')
-                                },
-                                "status": status.get('text')
-                            })
-        
-       
-        unique_flights = []
-        seen = set()
-        for f in flights_found:
-            key = f"{f['flight_number']}_{f['time']['scheduled']}"
-            if key not in seen:
-                seen.add(key)
-                unique_flights.append(f)
+        start_ts, end_ts = None, None
+        if date_str:
+            try:
+                start_ts, end_ts = day_range(date_str)
+            except ValueError:
+                pass
                 
-        return {"success": True, "data": unique_flights}
+        return {"success": True, "data": index.query(dest, start_ts, end_ts)}
         
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -118,6 +83,7 @@ def search_flights_data(origin, dest, date_str=None):
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        _metrics.begin("search_flights")
         query = urlparse(self.path).query
         params = parse_qs(query)
         origin = params.get('origin', [''])[0]
@@ -129,10 +95,15 @@ class handler(BaseHTTPRequestHandler):
         else:
              result = search_flights_data(origin, dest, date_str)
         
+        with _metrics.stage("serialize"):
+            body = json.dumps(result).encode('utf-8')
+        
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        _metrics.send_server_timing(self)
         self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        self.wfile.write(body)
+        _metrics.finish(len(body), result.get("success"))
 
 
 if __name__ == "__main__":
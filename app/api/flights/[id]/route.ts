@@ -2,6 +2,7 @@ import { NextResponse } from "next/server";
 import { exec } from "child_process";
 import { promisify } from "util";
 import path from "path";
+import { pythonApiBase } from "@/lib/python-api";
 
 const execAsync = promisify(exec);
 
@@ -17,10 +18,9 @@ export async function GET(
         const aircraft = url.searchParams.get("aircraft") || "";
 
 
-        if (process.env.VERCEL_URL) {
-            const protocol = process.env.NODE_ENV === 'development' ? 'http' : 'https';
-            const host = process.env.VERCEL_URL;
-            const apiUrl = `${protocol}://${host}/api/flight_details?id=${id}&airline_icao=${airline_icao}&aircraft=${aircraft}`;
+        const apiBase = pythonApiBase();
+        if (apiBase) {
+            const apiUrl = `${apiBase}/api/flight_details?id=${id}&airline_icao=${airline_icao}&aircraft=${aircraft}`;
 
             const res = await fetch(apiUrl);
             if (!res.ok) {
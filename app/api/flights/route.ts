@@ -2,6 +2,7 @@ import { NextResponse } from "next/server";
 import { exec } from "child_process";
 import { promisify } from "util";
 import path from "path";
+import { pythonApiBase } from "@/lib/python-api";
 
 const execAsync = promisify(exec);
 
@@ -15,10 +16,9 @@ export async function GET(request: Request) {
         const limit = url.searchParams.get("limit") || "1500";
 
 
-        if (process.env.VERCEL_URL) {
-            const protocol = process.env.NODE_ENV === 'development' ? 'http' : 'https';
-            const host = process.env.VERCEL_URL;
-            let apiUrl = `${protocol}://${host}/api/flight_service?limit=${limit}`;
+        const apiBase = pythonApiBase();
+        if (apiBase) {
+            let apiUrl = `${apiBase}/api/flight_service?limit=${limit}`;
 
             if (minLat && maxLat && minLon && maxLon) {
                 apiUrl += `&min_lat=${minLat}&max_lat=${maxLat}&min_lon=${minLon}&max_lon=${maxLon}`;
@@ -2,6 +2,7 @@ import { NextResponse } from "next/server";
 import { exec } from "child_process";
 import { promisify } from "util";
 import path from "path";
+import { pythonApiBase } from "@/lib/python-api";
 
 const execAsync = promisify(exec);
 
@@ -20,10 +21,9 @@ export async function GET(request: Request) {
 
     try {
 
-        if (process.env.VERCEL_URL) {
-            const protocol = process.env.NODE_ENV === 'development' ? 'http' : 'https';
-            const host = process.env.VERCEL_URL;
-            const url = `${protocol}://${host}/api/search_flights?origin=${originCode}&dest=${destCode}`;
+        const apiBase = pythonApiBase();
+        if (apiBase) {
+            const url = `${apiBase}/api/search_flights?origin=${originCode}&dest=${destCode}`;
 
             const res = await fetch(url);
             if (!res.ok) {
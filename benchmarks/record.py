@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+from replay import FLIGHT_FIELDS, RECORDINGS_DIR
+
+# Captures live FlightRadar24 payloads for replay.py. Needs network access and the
+# FlightRadar24 package; recordings land in benchmarks/recordings/.
+#
+#   python benchmarks/record.py [airport,airport,...] [pages] [details]
+
+DEFAULT_AIRPORTS = "GRU,GIG,BSB,LIS"
+
+
+def save(name, payload):
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    path = os.path.join(RECORDINGS_DIR, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"Saved {path}")
+
+
+def record(airports, pages=3, details=50):
+    from FlightRadar24 import FlightRadar24API
+
+    fr_api = FlightRadar24API()
+
+    flights = fr_api.get_flights()
+    save("get_flights", [{name: getattr(f, name, None) for name in FLIGHT_FIELDS} for f in flights])
+
+    schedules = {}
+    for airport in airports:
+        schedules[airport] = {}
+        for page in range(1, pages + 1):
+            try:
+                schedules[airport][str(page)] = fr_api.get_airport_details(airport, page=page)
+            except Exception as e:
+                print(f"Skipping {airport} page {page}: {e}")
+    save("get_airport_details", schedules)
+
+    flight_details = {}
+    for f in flights[:details]:
+        try:
+            flight_details[f.id] = fr_api.get_flight_details(f)
+        except Exception as e:
+            print(f"Skipping details for {f.id}: {e}")
+    save("get_flight_details", flight_details)
+
+
+if __name__ == "__main__":
+    airports = (sys.argv[1] if len(sys.argv) > 1 else DEFAULT_AIRPORTS).upper().split(",")
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    details = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    record(airports, pages, details)
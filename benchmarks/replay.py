@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+# Stand-in for FlightRadar24API that answers from recorded payloads (see record.py)
+# instead of the network, at a configurable snapshot size and with injected latency.
+# Without recordings it falls back to synthetic payloads of the same shape.
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+FLIGHT_FIELDS = ("id", "callsign", "latitude", "longitude", "heading", "altitude", "ground_speed",
+                 "airline_iata", "airline_icao", "aircraft_code", "origin_airport_iata",
+                 "destination_airport_iata", "number", "on_ground", "registration")
+
+AIRPORTS = ("GRU", "GIG", "BSB", "CGH", "CNF", "POA", "SSA", "REC", "FOR", "CWB", "LIS", "JFK", "MIA", "EZE", "SCL")
+AIRLINES = (("LA", "TAM", "LATAM"), ("G3", "GLO", "GOL"), ("AD", "AZU", "Azul"), ("TP", "TAP", "TAP Air Portugal"),
+            ("AA", "AAL", "American Airlines"), ("CM", "CMP", "Copa Airlines"))
+AIRCRAFT = (("A320", "Airbus A320-214"), ("A20N", "Airbus A320-251N"), ("A21N", "Airbus A321-271NX"),
+            ("B738", "Boeing 737-8EH"), ("B38M", "Boeing 737 MAX 8"), ("E195", "Embraer E195AR"),
+            ("AT76", "ATR 72-600"), ("B77W", "Boeing 777-32W(ER)"), ("B789", "Boeing 787-9 Dreamliner"))
+
+
+class Flight:
+    # Same attributes the handlers read from FlightRadar24's Flight objects.
+
+    def __init__(self, fields):
+        for name in FLIGHT_FIELDS:
+            setattr(self, name, fields.get(name))
+
+
+def _stable(*parts):
+    return int(hashlib.md5("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def synthetic_flights(count=2000, seed=1):
+    rnd = random.Random(seed)
+    flights = []
+    for i in range(count):
+        iata, icao, _ = rnd.choice(AIRLINES)
+        on_ground = rnd.random() < 0.1
+        flights.append({
+            "id": f"{0x30000000 + i:08x}",
+            "callsign": f"{icao}{rnd.randint(10, 9999)}",
+            "latitude": round(rnd.uniform(-60, 70), 4),
+            "longitude": round(rnd.uniform(-180, 180), 4),
+            "heading": rnd.randint(0, 359),
+            "altitude": 0 if on_ground else rnd.randint(1000, 41000),
+            "ground_speed": rnd.randint(0, 25) if on_ground else rnd.randint(180, 560),
+            "airline_iata": iata,
+            "airline_icao": icao,
+            "aircraft_code": rnd.choice(AIRCRAFT)[0],
+            "origin_airport_iata": rnd.choice(AIRPORTS),
+            "destination_airport_iata": rnd.choice(AIRPORTS),
+            "number": f"{iata}{rnd.randint(10, 9999)}",
+            "on_ground": int(on_ground),
+            "registration": f"PR-{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}{chr(65 + i // 676 % 26)}",
+        })
+    return flights
+
+
+def synthetic_schedule_page(airport, page, size=100, now=None):
+    rnd = random.Random(_stable(airport, page))
+    now = int(now or time.time()) // 3600 * 3600
+    data = []
+    for i in range(size):
+        iata, icao, name = rnd.choice(AIRLINES)
+        code, text = rnd.choice(AIRCRAFT)
+        departure = now + (page - 1) * 4 * 3600 + i * 150
+        data.append({"flight": {
+            "identification": {"id": f"{_stable(airport, page, i):08x}", "callsign": f"{icao}{1000 + i}",
+                               "number": {"default": f"{iata}{1000 + page * 100 + i}"}},
+            "airline": {"name": name, "code": {"iata": iata, "icao": icao}},
+            "aircraft": {"model": {"code": code, "text": text}},
+            "status": {"text": "Scheduled"},
+            "time": {"scheduled": {"departure": departure, "arrival": departure + rnd.randint(3600, 5 * 3600)},
+                     "estimated": {"departure": None}, "real": {"departure": None}},
+            "airport": {"destination": {"code": {"iata": rnd.choice([a for a in AIRPORTS if a != airport])}}},
+        }})
+    return {"airport": {"pluginData": {"schedule": {"departures": {
+        "data": data, "page": {"current": page, "total": 6}}}}}}
+
+
+def synthetic_flight_details(flight_id):
+    rnd = random.Random(_stable(flight_id))
+    iata, icao, name = rnd.choice(AIRLINES)
+    code, text = rnd.choice(AIRCRAFT)
+    has_photo = rnd.random() < 0.7
+    return {
+        "aircraft": {
+            "model": {"code": code, "text": text},
+            "registration": f"PR-{flight_id[-3:].upper()}",
+            "images": {"medium": [{"src": f"https://cdn.example.invalid/photos/{flight_id}.jpg"}]} if has_photo else {},
+        },
+        "airline": {"name": name, "code": {"iata": iata, "icao": icao}},
+        "airport": {"origin": {"name": "Sao Paulo Guarulhos International Airport"},
+                    "destination": {"name": "Lisbon Humberto Delgado Airport"}},
+        "status": {"text": "Estimated- 14:05"},
+    }
+
+
+def load_recording(name):
+    path = os.path.join(RECORDINGS_DIR, f"{name}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ReplayFlightRadar24API:
+    # Settings are class-level so every instance the handlers create shares them.
+    flight_count = 15000
+    # Like upstream, get_flights() answers with at most this many flights.
+    result_cap = 1500
+    latency = {}
+    jitter = 0.0
+    calls = {}
+    _lock = threading.Lock()
+    _flights = None
+    _recordings = {}
+
+    @classmethod
+    def configure(cls, flight_count=None, latency=None, jitter=None, result_cap=None):
+        if result_cap is not None:
+            cls.result_cap = result_cap
+        if flight_count is not None:
+            cls.flight_count = flight_count
+            cls._flights = None
+        if latency is not None:
+            cls.latency = dict(latency)
+        if jitter is not None:
+            cls.jitter = jitter
+
+    @classmethod
+    def reset_calls(cls):
+        with cls._lock:
+            cls.calls = {}
+
+    @classmethod
+    def _recording(cls, name):
+        if name not in cls._recordings:
+            cls._recordings[name] = load_recording(name)
+        return cls._recordings[name]
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        delay = self.latency.get(method, self.latency.get("*", 0.0))
+        if delay or self.jitter:
+            time.sleep(delay + random.uniform(0, self.jitter))
+
+    @classmethod
+    def _world(cls):
+        # The recorded snapshot scaled to flight_count: repeated with fresh ids and
+        # nudged positions when the recording is smaller, sampled when it is bigger.
+        with cls._lock:
+            if cls._flights is None:
+                base = cls._recording("get_flights") or synthetic_flights()
+                rnd = random.Random(7)
+                flights = []
+                for i in range(cls.flight_count):
+                    fields = dict(base[i % len(base)])
+                    if i >= len(base):
+                        fields["id"] = f"{(_stable(fields.get('id'), i)):08x}"
+                        if fields.get("latitude") is not None:
+                            fields["latitude"] = max(min(fields["latitude"] + rnd.uniform(-3, 3), 85), -85)
+                        if fields.get("longitude") is not None:
+                            fields["longitude"] = ((fields["longitude"] + rnd.uniform(-3, 3) + 180) % 360) - 180
+                    flights.append(fields)
+                cls._flights = flights
+            return cls._flights
+
+    def get_flights(self, airline=None, bounds=None, registration=None, aircraft_type=None, details=False):
+        self._call("get_flights")
+        flights = self._world()
+        if airline:
+            flights = [f for f in flights if f.get("airline_icao") == airline]
+        if bounds:
+            north, south, west, east = map(float, bounds.split(","))
+            flights = [f for f in flights if f.get("latitude") is not None and f.get("longitude") is not None
+                       and south <= f["latitude"] <= north and west <= f["longitude"] <= east]
+        return [Flight(f) for f in flights[:self.result_cap or None]]
+
+    def get_bounds_by_point(self, latitude, longitude, radius):
+        delta = radius / 111320.0
+        return f"{latitude + delta},{latitude - delta},{longitude - delta},{longitude + delta}"
+
+    def get_airport_details(self, code, flight_limit=100, page=1):
+        self._call("get_airport_details")
+        recorded = self._recording("get_airport_details")
+        if recorded:
+            pages = recorded.get(code.upper()) or recorded[sorted(recorded)[_stable(code) % len(recorded)]]
+            return pages.get(str(page)) or {"airport": {"pluginData": {"schedule": {"departures": {"data": []}}}}}
+        return synthetic_schedule_page(code.upper(), page, flight_limit)
+
+    def get_flight_details(self, flight):
+        self._call("get_flight_details")
+        flight_id = getattr(flight, "id", flight)
+        recorded = self._recording("get_flight_details")
+        if recorded:
+            return recorded.get(flight_id) or recorded[sorted(recorded)[_stable(flight_id) % len(recorded)]]
+        return synthetic_flight_details(flight_id)
+
+    def get_airlines(self):
+        return [{"Name": name, "Code": iata, "ICAO": icao} for iata, icao, name in AIRLINES]
+
+
+def install():
+    # Must run before any api module is imported: _client picks the class up from here.
+    module = types.ModuleType("FlightRadar24")
+    module.FlightRadar24API = ReplayFlightRadar24API
+    sys.modules["FlightRadar24"] = module
+    return ReplayFlightRadar24API
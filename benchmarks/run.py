@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline benchmarks for the api handlers against replayed FlightRadar24 payloads.
+# Reports per-handler latency percentiles, throughput, peak memory and upstream calls,
+# and can save a baseline and fail when a later run regresses against it.
+#
+#   python benchmarks/run.py [--flights 15000] [--latency 0.05] [--requests 200] [--concurrency 8]
+#   python benchmarks/run.py --save baseline.json
+#   python benchmarks/run.py --compare baseline.json [--tolerance 0.25]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(BENCH_DIR, "..", "api")
+
+BOXES = (
+    (-35.0, 5.0, -75.0, -34.0),     # Brazil
+    (35.0, 60.0, -11.0, 30.0),      # Europe
+    (24.0, 50.0, -125.0, -66.0),    # United States
+    (-23.8, -23.2, -46.9, -46.3),   # Sao Paulo
+    (-60.0, 60.0, 150.0, -150.0),   # across the antimeridian
+)
+
+# Differences below these are noise, however large they are relatively.
+MIN_DELTA = {"p50_ms": 1.0, "p90_ms": 2.0, "peak_kb": 64.0}
+
+QUERIES = ("gru", "sao", "lis", "new", "rio", "int", "par", "mad", "joh", "bra", "ai", "x")
+
+
+def build_cases(replay):
+    # Imported here: the api modules read their settings and pick up the fake API at import time.
+    import flight_service
+    import flights
+    import search_flights
+    import live_departures
+    import flight_details
+    from _airports import search_airports
+    from replay import AIRPORTS, AIRLINES, AIRCRAFT
+
+    def flight_service_case(rnd):
+        box = rnd.choice(BOXES)
+        return flight_service.get_flights_in_bounds(*box, limit=1500)
+
+    def flights_case(rnd):
+        box = rnd.choice(BOXES)
+        return flights.get_flights_in_bounds(*box, limit=1500)
+
+    def search_flights_case(rnd):
+        origin, dest = rnd.sample(AIRPORTS, 2)
+        return search_flights.search_flights_data(origin, dest)
+
+    cursors = {}
+
+    def live_departures_case(rnd):
+        airport = rnd.choice(AIRPORTS)
+        # Follow each board a few pages in, then start over.
+        cursor = cursors.pop(airport, None) if rnd.random() < 0.75 else None
+        result = live_departures.get_live_departures_data(airport, 20, cursor)
+        if result.get("next_cursor"):
+            cursors[airport] = result["next_cursor"]
+        return result
+
+    def flight_details_case(rnd):
+        f = rnd.choice(replay._world())
+        airline = rnd.choice(AIRLINES)[1]
+        aircraft = rnd.choice(AIRCRAFT)[0]
+        return flight_details.get_flight_details_data(f["id"], airline, aircraft)
+
+    def airports_case(rnd):
+        return {"success": True, "data": search_airports(rnd.choice(QUERIES), limit=10)}
+
+    return {
+        "flight_service": flight_service_case,
+        "flights": flights_case,
+        "search_flights": search_flights_case,
+        "live_departures": live_departures_case,
+        "flight_details": flight_details_case,
+        "airports": airports_case,
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0))
+    return sorted_values[k]
+
+
+def run_case(replay, name, case, requests, concurrency, memory_calls, seed):
+    replay.reset_calls()
+    rnd = random.Random(seed)
+
+    start = time.perf_counter()
+    case(rnd)
+    cold = time.perf_counter() - start
+
+    def one(i):
+        local = random.Random(seed * 1000003 + i)
+        t0 = time.perf_counter()
+        try:
+            ok = bool(case(local).get("success"))
+        except Exception:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    upstream = dict(replay.calls)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for i in range(memory_calls):
+        case(random.Random(seed + i))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(t for t, _ in results)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "cold_ms": cold * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "throughput": requests / wall if wall else 0.0,
+        "peak_kb": peak / 1024,
+        "upstream_calls": upstream,
+    }
+
+
+def print_report(results):
+    header = f"{'handler':<16}{'reqs':>6}{'errs':>6}{'cold ms':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}" \
+             f"{'max ms':>9}{'req/s':>10}{'peak KB':>10}  upstream calls"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        upstream = ", ".join(f"{k}={v}" for k, v in sorted(r["upstream_calls"].items())) or "-"
+        print(f"{name:<16}{r['requests']:>6}{r['errors']:>6}{r['cold_ms']:>10.1f}{r['p50_ms']:>9.2f}"
+              f"{r['p90_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['max_ms']:>9.1f}{r['throughput']:>10.1f}"
+              f"{r['peak_kb']:>10.0f}  {upstream}")
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, min_delta in MIN_DELTA.items():
+            if r[metric] > base[metric] * (1 + tolerance) and r[metric] - base[metric] > min_delta:
+                regressions.append(f"{name} {metric}: {base[metric]:.2f} -> {r[metric]:.2f}")
+        if r["throughput"] < base["throughput"] / (1 + tolerance):
+            regressions.append(f"{name} throughput: {base['throughput']:.1f} -> {r['throughput']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the api handlers against a replayed FlightRadar24.")
+    parser.add_argument("--flights", type=int, default=15000, help="aircraft in the replayed world snapshot")
+    parser.add_argument("--latency", type=float, default=0.05, help="injected seconds per upstream call")
+    parser.add_argument("--result-cap", type=int, default=1500, help="flights per upstream get_flights call (0 = no cap)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds per upstream call")
+    parser.add_argument("--requests", type=int, default=200, help="measured calls per handler")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers")
+    parser.add_argument("--memory-calls", type=int, default=20, help="calls traced for peak memory")
+    parser.add_argument("--only", default="", help="comma-separated handlers to run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    # Private caches, so runs neither see nor disturb a real server's.
+    os.environ["PASSAIR_CACHE_DIR"] = tempfile.mkdtemp(prefix="passair-bench-")
+    # Measure the handlers, not the upstream rate limit.
+    os.environ.setdefault("PASSAIR_UPSTREAM_RATE", "0")
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, API_DIR)
+
+    import replay as replay_module
+    replay = replay_module.install()
+    replay.configure(flight_count=args.flights, latency={"*": args.latency}, jitter=args.jitter,
+                     result_cap=args.result_cap)
+
+    cases = build_cases(replay)
+    only = [name for name in args.only.split(",") if name]
+    unknown = [name for name in only if name not in cases]
+    if unknown:
+        parser.error(f"unknown handlers: {', '.join(unknown)} (choose from {', '.join(cases)})")
+
+    print(f"{args.flights} flights, {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} ms upstream latency, "
+          f"{args.requests} requests x {args.concurrency} concurrent\n")
+
+    results = {}
+    for name, case in cases.items():
+        if only and name not in only:
+            continue
+        results[name] = run_case(replay, name, case, args.requests, args.concurrency, args.memory_calls, args.seed)
+
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,16 @@
 import { exec } from "child_process";
 import { promisify } from "util";
 import path from "path";
+import { pythonApiBase } from "@/lib/python-api";
 
 const execAsync = promisify(exec);
 
 export async function getLiveDepartures(airport: string = "GRU") {
     try {
 
-        if (process.env.VERCEL_URL) {
-            const protocol = process.env.NODE_ENV === 'development' ? 'http' : 'https';
-            const host = process.env.VERCEL_URL; // Vercel automatically sets this
-            const url = `${protocol}://${host}/api/live_departures?airport=${airport}`;
+        const apiBase = pythonApiBase();
+        if (apiBase) {
+            const url = `${apiBase}/api/live_departures?airport=${airport}`;
             console.log(`Fetching from Python API: ${url}`);
             const res = await fetch(url);
             if (!res.ok) {
@@ -0,0 +1,16 @@
+// Base URL of the Python backend when it runs as an HTTP service: either the
+// long-running server (scripts/serve_api.py, set PYTHON_API_URL) or the Vercel
+// functions. Returns null when the routes should fall back to spawning a script.
+export function pythonApiBase(): string | null {
+    if (process.env.PYTHON_API_URL) {
+        return process.env.PYTHON_API_URL.replace(/\/+$/, "");
+    }
+
+    if (process.env.VERCEL_URL) {
+        const protocol = process.env.NODE_ENV === 'development' ? 'http' : 'https';
+        const host = process.env.VERCEL_URL; // Vercel automatically sets this
+        return `${protocol}://${host}`;
+    }
+
+    return null;
+}
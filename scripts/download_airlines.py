@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _client import get_api
+
+def download_airlines(output_dir="api/data"):
+    output_file = os.path.join(output_dir, "airlines.json")
+    print("Downloading airlines from FlightRadar24...")
+    try:
+        # Entries already on disk are kept unless FlightRadar24 has the same ICAO code.
+        airlines = {}
+        if os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8") as f:
+                airlines = {a['icao']: a for a in json.load(f)}
+        
+        for a in get_api().get_airlines():
+            icao = (a.get('ICAO') or "").strip().upper()
+            iata = (a.get('Code') or "").strip().upper()
+            if len(icao) == 3 and len(iata) == 2:
+                airlines[icao] = {"iata": iata, "icao": icao, "name": a.get('Name') or icao}
+        
+        processed_airlines = sorted(airlines.values(), key=lambda x: (x['iata'], x['icao']))
+        
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(processed_airlines, f, ensure_ascii=False, indent=None) # Minified
+            
+        print(f"Saved {len(processed_airlines)} airlines to {output_file}")
+        
+    except Exception as e:
+        print(f"Failed to download airlines: {e}")
+
+if __name__ == "__main__":
+    download_airlines()
@@ -1,8 +1,19 @@
-import requests
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _airports import Airport, write_binary_index
+
+def build_airport_index(processed_airports, output_dir="api/data"):
+    airports = [Airport(a['iata'], a['name'], a['city'], a['country'], a['lat'], a['lon']) for a in processed_airports]
+    output_file = os.path.join(output_dir, "airports.bin")
+    write_binary_index(airports, output_file)
+    print(f"Saved search index for {len(airports)} airports to {output_file}")
 
 def download_airports():
+    import requests
+    
     url = "https://raw.githubusercontent.com/mwgg/Airports/master/airports.json"
     print(f"Downloading airports from {url}...")
     try:
@@ -35,8 +46,15 @@ def download_airports():
             
         print(f"Saved {len(processed_airports)} airports to {output_file}")
         
+        build_airport_index(processed_airports, output_dir)
+        
     except Exception as e:
         print(f"Failed to download airports: {e}")
 
 if __name__ == "__main__":
-    download_airports()
+    if "--index-only" in sys.argv:
+        # Rebuild airports.bin from the airports.json already on disk.
+        with open(os.path.join("api/data", "airports.json"), "r", encoding="utf-8") as f:
+            build_airport_index(json.load(f))
+    else:
+        download_airports()
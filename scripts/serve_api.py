@@ -0,0 +1,198 @@
+import importlib
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, urlencode
+
+# Long-running alternative to spawning one Python process per request: loads every
+# api/*.py handler once and serves them over HTTP with keep-alive, using the same
+# rewrites as vercel.json. Point the Next.js routes at it with PYTHON_API_URL.
+#
+#   python scripts/serve_api.py [port] [host]
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+API_DIR = os.path.join(ROOT_DIR, "api")
+sys.path.insert(0, API_DIR)
+
+WORKERS = int(os.environ.get("PASSAIR_WORKERS", "16"))
+
+
+def load_modules():
+    modules = {}
+    for filename in sorted(os.listdir(API_DIR)):
+        name, ext = os.path.splitext(filename)
+        if ext != ".py" or name.startswith("_"):
+            continue
+        modules[name] = importlib.import_module(name)
+    return modules
+
+
+def load_rewrites():
+    with open(os.path.join(ROOT_DIR, "vercel.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    rewrites = []
+    for rule in config.get("rewrites", []):
+        pattern = re.sub(r":(\w+)", r"(?P<\1>[^/]+)", rule["source"])
+        rewrites.append((re.compile(f"^{pattern}$"), rule["destination"]))
+    return rewrites
+
+
+MODULES = load_modules()
+HANDLERS = {name: module.handler for name, module in MODULES.items() if hasattr(module, "handler")}
+# Streaming handlers hold a thread per client; they get threads of their own on top of
+# WORKERS so open streams never starve the other endpoints.
+STREAM_WORKERS = sum(getattr(h, "max_clients", 0) for h in HANDLERS.values() if getattr(h, "streaming", False))
+REWRITES = load_rewrites()
+
+
+def resolve(raw_path):
+    url = urlparse(raw_path)
+    query = parse_qs(url.query)
+
+    destination = None
+    for pattern, target in REWRITES:
+        match = pattern.match(url.path)
+        if match:
+            destination = target
+            for key, value in match.groupdict().items():
+                destination = destination.replace(f":{key}", value)
+            break
+
+    if destination is None:
+        destination = url.path.rstrip("/") + ".py"
+
+    target = urlparse(destination)
+    name = os.path.splitext(os.path.basename(target.path))[0]
+    for key, values in parse_qs(target.query).items():
+        query.setdefault(key, values)
+
+    return HANDLERS.get(name), f"/api/{name}?{urlencode(query, doseq=True)}"
+
+
+class ServedRequest:
+    # Mixed in ahead of each api handler class while it runs inside the server.
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections give their worker back after this many seconds.
+    timeout = 15
+    _buffering = False
+    _streaming = False
+
+    def end_headers(self):
+        if self._streaming:
+            # Streamed responses have no length up front; the end of the body is the end of the connection.
+            self.send_header('Connection', 'close')
+        # While a buffered handler runs, hold the headers back until the body length is known.
+        if not self._buffering:
+            super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+_served_classes = {}
+
+
+def served_class(target):
+    cls = _served_classes.get(target)
+    if cls is None:
+        cls = _served_classes[target] = type(f"Served{target.__module__}", (ServedRequest, target), {})
+    return cls
+
+
+class Dispatcher(ServedRequest, BaseHTTPRequestHandler):
+
+    def _send_error(self, code, message):
+        body = json.dumps({"success": False, "error": message}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        target, path = resolve(self.path)
+        if target is None:
+            self._send_error(404, "Not found")
+            return
+        if not hasattr(target, method):
+            self._send_error(405, "Method not allowed")
+            return
+
+        self.path = path
+        # Run the handler as an instance of its own class (plus ServedRequest) on this
+        # connection, then switch back so the next keep-alive request is dispatched again.
+        self.__class__ = served_class(target)
+        try:
+            if getattr(target, "streaming", False):
+                self._streaming = True
+                getattr(self, method)()
+                return
+
+            wfile = self.wfile
+            self.wfile = io.BytesIO()
+            self._buffering = True
+            try:
+                getattr(self, method)()
+            finally:
+                body = self.wfile.getvalue()
+                self.wfile = wfile
+                self._buffering = False
+
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            self.__class__ = Dispatcher
+
+    def do_GET(self):
+        self._dispatch("do_GET")
+
+    def do_POST(self):
+        self._dispatch("do_POST")
+
+
+class PooledHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler_class, workers=WORKERS + STREAM_WORKERS):
+        super().__init__(address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def serve(host="127.0.0.1", port=8000):
+    server = PooledHTTPServer((host, port), Dispatcher)
+
+    # Handlers with background work (cache pre-warming, refresh loops) start it here,
+    # since a one-shot function invocation would never live long enough to use it.
+    for module in MODULES.values():
+        start_background = getattr(module, "start_background", None)
+        if start_background:
+            start_background()
+
+    print(f"Serving {', '.join(sorted(HANDLERS))} on http://{host}:{port} with {WORKERS} workers "
+          f"(+{STREAM_WORKERS} for streams)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get("PASSAIR_API_PORT", "8000"))
+    host = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("PASSAIR_API_HOST", "127.0.0.1")
+    serve(host, port)
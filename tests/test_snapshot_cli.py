@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One-shot run of api/flight_service.py, the way the Next.js routes spawn it, against
+# the replayed FlightRadar24 from benchmarks/replay.py.
+CLI_RUN = """
+import runpy, sys
+sys.path.insert(0, "benchmarks")
+import replay
+replay.install()
+sys.argv = ["api/flight_service.py", "", "", "", "", "5"]
+runpy.run_path("api/flight_service.py", run_name="__main__")
+"""
+
+
+class SnapshotCliTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, PASSAIR_CACHE_DIR=self.cache_dir.name, PASSAIR_SNAPSHOT_TTL="0.5")
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def run_cli(self):
+        done = subprocess.run([sys.executable, "-c", CLI_RUN], cwd=ROOT, env=self.env,
+                              capture_output=True, text=True, timeout=60)
+        self.assertEqual(done.returncode, 0, done.stderr)
+        result = json.loads(done.stdout)
+        self.assertTrue(result["success"], result)
+        return result
+
+    def disk_version(self):
+        with open(os.path.join(self.cache_dir.name, "flights_snapshot.json"), encoding="utf-8") as f:
+            return json.load(f)["version"]
+
+    def test_stale_run_advances_the_snapshot(self):
+        first = self.run_cli()
+        self.assertFalse(first["stale"])
+
+        time.sleep(1)
+        second = self.run_cli()
+        # The stale snapshot is served right away, and refreshed before the process exits.
+        self.assertTrue(second["stale"])
+        self.assertEqual(second["version"], first["version"])
+        self.assertGreater(self.disk_version(), first["version"])
+
+        third = self.run_cli()
+        self.assertGreater(third["version"], first["version"])
+
+
+if __name__ == "__main__":
+    unittest.main()